@@ -0,0 +1,224 @@
+"""Benchmarks for the RouteFinder algorithms on synthetic street-like graphs and saved snapshots.
+
+Each measurement is written as one JSON object per line, e.g.::
+
+    python benchmarks/bench_route_finder.py --sizes 10 20 40 --output results.jsonl
+
+and a later run can be checked against a saved one with ``--compare results.jsonl``,
+which exits with a non-zero status if any measurement got slower by more than ``--tolerance``.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import graphs  # noqa: E402
+from csr_graph import CSRGraph  # noqa: E402
+from route import Route  # noqa: E402
+from route_finder import RouteFinder  # noqa: E402
+
+
+def measure(fn, repeat):
+    """Run ``fn`` untraced to time it (best of ``repeat`` runs), and once more under ``tracemalloc``
+    for its peak memory. Returns (seconds, peak memory in bytes, return value of the timed run).
+    """
+    seconds = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        seconds = min(seconds, time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak, result
+
+
+def prefixes(route):
+    """All partial routes of a route, from just the source up to the full route."""
+    partial = Route()
+    partial.nodes.append(route.nodes[0])
+    routes = [partial.copy()]
+    for e in route.edges:
+        partial.add_edge(e)
+        routes.append(partial.copy())
+    return routes
+
+
+def dijkstra_path(csr, u, v, cutoff):
+    """Shortest path between two nodes by a plain Dijkstra search from the first one,
+    to compare ``CSRGraph.shortest_path`` with.
+    """
+    i, j = csr.index[u], csr.index[v]
+    pred = {}
+    for k, _ in csr.iter_dijkstra(i, cutoff=cutoff, pred=pred):
+        if k == j:
+            return csr.path_from_pred(pred, i, j)
+
+
+def edge_changes(csr, distance, count, seed=0):
+    """Some edges from nodes within reach of the source, each with its slots, its length
+    and a longer length.
+    """
+    rng = np.random.default_rng(seed)
+    changes = []
+    for i in rng.choice(np.flatnonzero(np.isfinite(distance)), size=count).tolist():
+        if csr.offsets[i + 1] > csr.offsets[i]:
+            s = int(csr.offsets[i])
+            j, k, length = int(csr.neighbors[s]), int(csr.keys[s]), float(csr.lengths[s])
+            edge = (int(csr.node_ids[i]), int(csr.node_ids[j]), k)
+            changes.append((edge, csr.edge_slots(i, j, k), length, 2 * length))
+    return changes
+
+
+def center_node(csr):
+    """The node closest to the middle of the graph (or the first node, without coordinates)."""
+    if csr.x is None:
+        return int(csr.node_ids[0])
+    d = (csr.x - csr.x.mean()) ** 2 + (csr.y - csr.y.mean()) ** 2
+    return int(csr.node_ids[d.argmin()])
+
+
+def bench_graph(name, csr, budgets, brute_force_time, repeat):
+    source = center_node(csr)
+    base = {'graph': name, 'nodes': csr.number_of_nodes(), 'edges': len(csr.neighbors) // 2}
+
+    for max_distance in budgets:
+        record = dict(base, max_distance=max_distance)
+
+        seconds, peak, route = measure(
+            lambda: RouteFinder(csr, source, max_distance).greedy_nearest(), repeat)
+        yield dict(record, algorithm='greedy_nearest', seconds=seconds, calls=1,
+                   throughput=len(route.edges) / seconds, peak_memory=peak,
+                   route_edges=len(route.edges))
+
+        # run the per-step primitives along the greedy route (after it marked its nodes as visited)
+        rf = RouteFinder(csr, source, max_distance)
+        routes = prefixes(rf.greedy_nearest())
+        seconds, peak, _ = measure(lambda: [rf.get_viable_edges(r) for r in routes], repeat)
+        yield dict(record, algorithm='get_viable_edges', seconds=seconds, calls=len(routes),
+                   throughput=len(routes) / seconds, peak_memory=peak)
+
+        routes = [r for r in routes if rf.get_viable_edges(r)]
+        seconds, peak, _ = measure(lambda: [rf.path_to_next_node(r) for r in routes], repeat)
+        yield dict(record, algorithm='path_to_next_node', seconds=seconds, calls=len(routes),
+                   throughput=len(routes) / max(seconds, 1e-9), peak_memory=peak)
+
+        # paths from the end of each partial route back to the source (the point-to-point query
+        # that closes the route of anytime_route), by A* or bidirectional search and by Dijkstra
+        nodes = [r.nodes[-1] for r in routes]
+        seconds, peak, _ = measure(lambda: [rf.path_to_source(u) for u in nodes], repeat)
+        yield dict(record, algorithm='path_to_source', seconds=seconds, calls=len(nodes),
+                   throughput=len(nodes) / max(seconds, 1e-9), peak_memory=peak)
+        seconds, peak, _ = measure(
+            lambda: [dijkstra_path(csr, u, source, max_distance / 2) for u in nodes], repeat)
+        yield dict(record, algorithm='dijkstra_path_to_source', seconds=seconds, calls=len(nodes),
+                   throughput=len(nodes) / max(seconds, 1e-9), peak_memory=peak)
+
+        # changing the length of an edge on a live finder (and back again), against building
+        # a fresh finder and distance table for each changed graph
+        rf = RouteFinder(csr, source, max_distance)
+        changes = edge_changes(csr, rf.get_distance_from_source(), 20)
+
+        def update_edges():
+            for edge, _, length, longer in changes:
+                rf.set_edge_lengths({edge: longer})
+                rf.set_edge_lengths({edge: length})
+        seconds, peak, _ = measure(update_edges, repeat)
+        yield dict(record, algorithm='set_edge_lengths', seconds=seconds, calls=2 * len(changes),
+                   throughput=2 * len(changes) / max(seconds, 1e-9), peak_memory=peak)
+
+        def fresh_finders():
+            for _, slots, _, longer in changes:
+                changed = csr.with_edge_changes({s: longer for s in slots})
+                RouteFinder(changed, source, max_distance).get_distance_from_source()
+        seconds, peak, _ = measure(fresh_finders, repeat)
+        yield dict(record, algorithm='fresh_finder', seconds=seconds, calls=len(changes),
+                   throughput=len(changes) / max(seconds, 1e-9), peak_memory=peak)
+
+        # brute force rarely finishes on real budgets, so measure how fast it enumerates routes
+        def enumerate_routes():
+            rf = RouteFinder(csr, source, max_distance)
+            return sum(1 for _ in rf.iter_routes(time_limit=brute_force_time))
+        seconds, peak, count = measure(enumerate_routes, repeat)
+        yield dict(record, algorithm='brute_force', seconds=seconds, calls=count,
+                   throughput=count / seconds, peak_memory=peak,
+                   complete=seconds < brute_force_time)
+
+
+def compare(results, baseline_path, tolerance):
+    """Return the measurements that are slower than in the baseline file
+    by more than the tolerance.
+    """
+    def key(r):
+        return (r['graph'], r['max_distance'], r['algorithm'])
+
+    with open(baseline_path) as f:
+        baseline = {key(r): r for r in map(json.loads, f)}
+
+    slower = []
+    for r in results:
+        b = baseline.get(key(r))
+        # compare throughput, since time-limited runs always take about the same time
+        if b is not None and r['throughput'] < b['throughput'] / (1 + tolerance):
+            slower.append((r, b))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 20, 40],
+                        help='number of nodes along each side of the synthetic graphs')
+    parser.add_argument('--budgets', type=float, nargs='+', default=[500.0, 1000.0, 2000.0],
+                        help='maximum route distances (synthetic blocks are about 100 long)')
+    parser.add_argument('--snapshot', action='append', default=[],
+                        help='directory of a graph snapshot saved with CSRGraph.save (repeatable)')
+    parser.add_argument('--brute-force-time', type=float, default=2.0,
+                        help='time limit in seconds for each brute force enumeration')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timed runs of each measurement '
+                             '(the fastest one is reported)')
+    parser.add_argument('--output', help='write results to this file instead of standard output')
+    parser.add_argument('--compare',
+                        help='results file from an earlier run to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown relative to the compared results')
+    args = parser.parse_args(argv)
+
+    inputs = []
+    for n in args.sizes:
+        inputs.append((f'grid-{n}', lambda n=n: CSRGraph.from_networkx(graphs.grid_graph(n))))
+        inputs.append((f'planar-{n}',
+                       lambda n=n: CSRGraph.from_networkx(graphs.random_planar_graph(n))))
+    for path in args.snapshot:
+        inputs.append((os.path.basename(os.path.normpath(path)),
+                       lambda path=path: CSRGraph.load(path)))
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    results = []
+    for name, load in inputs:
+        for record in bench_graph(name, load(), args.budgets, args.brute_force_time, args.repeat):
+            results.append(record)
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+    if args.output:
+        out.close()
+
+    if args.compare:
+        slower = compare(results, args.compare, args.tolerance)
+        for r, b in slower:
+            print(f"slower: {r['graph']} {r['algorithm']} max_distance={r['max_distance']}: "
+                  f"{r['throughput']:.1f}/s vs {b['throughput']:.1f}/s", file=sys.stderr)
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import networkx as nx
+import numpy as np
+
+
+def grid_graph(n: int, spacing: float = 100.0, parallel_fraction: float = 0.05,
+               seed: int = 0) -> nx.MultiGraph:
+    """Generate an ``n`` by ``n`` street grid, where blocks have random lengths around ``spacing``
+    and a fraction of the streets have a second, longer parallel edge.
+
+    :param n: Number of nodes along each side
+    :type n: int
+    :param spacing: Average block length
+    :type spacing: float
+    :param parallel_fraction: Fraction of edges that get a parallel edge
+    :type parallel_fraction: float
+    :param seed: Seed for the random number generator
+    :type seed: int
+    :return: Undirected graph with ``length`` edge attributes and ``x``/``y`` node attributes
+    :rtype: MultiGraph
+    """
+    rng = np.random.default_rng(seed)
+    G = nx.MultiGraph()
+    for i in range(n):
+        for j in range(n):
+            G.add_node(i * n + j, x=j * spacing, y=i * spacing)
+
+    for i in range(n):
+        for j in range(n):
+            u = i * n + j
+            for v in ([u + 1] if j < n - 1 else []) + ([u + n] if i < n - 1 else []):
+                length = spacing * rng.uniform(0.8, 1.2)
+                G.add_edge(u, v, key=0, length=length)
+                if rng.random() < parallel_fraction:
+                    G.add_edge(u, v, key=1, length=length * rng.uniform(1.0, 1.5))
+    return G
+
+
+def random_planar_graph(n: int, spacing: float = 100.0, keep: float = 0.8,
+                        seed: int = 0) -> nx.MultiGraph:
+    """Generate a random planar street network: nodes are jittered grid points,
+    each grid street is kept with probability ``keep``, and some blocks get one diagonal.
+    Edge lengths are the straight-line distances between the nodes.
+
+    :param n: Number of nodes along each side
+    :type n: int
+    :param spacing: Average block length
+    :type spacing: float
+    :param keep: Probability of keeping each grid street
+    :type keep: float
+    :param seed: Seed for the random number generator
+    :type seed: int
+    :return: Largest connected component, with ``length`` edge attributes
+        and ``x``/``y`` node attributes
+    :rtype: MultiGraph
+    """
+    rng = np.random.default_rng(seed)
+    xy = (np.stack(np.meshgrid(np.arange(n), np.arange(n)), axis=-1).reshape(-1, 2)
+          + rng.uniform(-0.3, 0.3, size=(n * n, 2))) * spacing
+
+    G = nx.MultiGraph()
+    for u, (x, y) in enumerate(xy.tolist()):
+        G.add_node(u, x=x, y=y)
+
+    def add(u, v):
+        G.add_edge(u, v, length=float(np.hypot(*(xy[u] - xy[v]))))
+
+    for i in range(n):
+        for j in range(n):
+            u = i * n + j
+            if j < n - 1 and rng.random() < keep:
+                add(u, u + 1)
+            if i < n - 1 and rng.random() < keep:
+                add(u, u + n)
+            if i < n - 1 and j < n - 1 and rng.random() < 0.1:
+                add(u, u + n + 1)  # at most one diagonal per block keeps the graph planar
+
+    largest = max(nx.connected_components(G), key=len)
+    return G.subgraph(largest).copy()
@@ -0,0 +1,81 @@
+import csr_graph
+from csr_graph import CSRGraph
+import multiprocessing
+import networkx as nx
+from route import Route
+from route_finder import RouteFinder
+import time
+from typing import Iterable, List, NamedTuple, Optional, Union
+
+
+class BatchJob(NamedTuple):
+    """A single route request: a source node, a maximum distance,
+    and optionally the nodes that have already been visited.
+    """
+    source: int
+    max_distance: float
+    visited: Optional[Iterable[int]] = None
+
+
+class BatchResult(NamedTuple):
+    """The route found for a ``BatchJob``, and how long it took to find it (in seconds).
+    """
+    source: int
+    max_distance: float
+    route: Route
+    seconds: float
+
+
+# the graph shared by all jobs in a worker process, set once when the worker starts
+_csr: Optional[CSRGraph] = None
+
+
+def _init_worker(csr: CSRGraph) -> None:
+    global _csr
+    _csr = csr
+
+
+def _run_job(job: BatchJob) -> BatchResult:
+    start = time.perf_counter()
+    rf = RouteFinder(_csr, job.source, job.max_distance, visited=job.visited)
+    route = rf.greedy_nearest()
+    return BatchResult(job.source, job.max_distance, route, time.perf_counter() - start)
+
+
+def greedy_nearest_batch(G: Union[nx.MultiGraph, CSRGraph], jobs: List[BatchJob],
+                         processes: Optional[int] = None) -> List[BatchResult]:
+    """Run ``RouteFinder.greedy_nearest`` for many jobs over the same graph,
+    using a pool of processes.
+
+    The graph is sent to each worker process only once: where the platform supports it, the workers
+    are forked and inherit the graph, and otherwise it is passed to each worker when it starts.
+
+    :param G: Input graph
+    :type G: MultiGraph or CSRGraph
+    :param jobs: List of jobs, given as ``BatchJob`` or as (source, max_distance[, visited]) tuples
+    :type jobs: List[BatchJob]
+    :param processes: Number of worker processes (defaults to the number of CPUs).
+        With a single process, the jobs run in the current process.
+    :type processes: int, optional
+    :return: One result per job, in the same order as the jobs
+    :rtype: List[BatchResult]
+    """
+    global _csr
+    csr = G if isinstance(G, CSRGraph) else csr_graph.get_csr_graph(G)
+    jobs = [BatchJob(*job) for job in jobs]
+
+    try:
+        if processes == 1:
+            _init_worker(csr)
+            return [_run_job(job) for job in jobs]
+
+        if 'fork' in multiprocessing.get_all_start_methods():
+            _csr = csr  # inherited by the forked workers
+            ctx = multiprocessing.get_context('fork')
+            with ctx.Pool(processes) as pool:
+                return pool.map(_run_job, jobs, chunksize=1)
+
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(csr,)) as pool:
+            return pool.map(_run_job, jobs, chunksize=1)
+    finally:
+        _csr = None  # so that this process does not keep the graph alive after the batch
@@ -0,0 +1,878 @@
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import os
+import weakref
+from edge import Edge
+import networkx as nx
+import numpy as np
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class CSRGraph():
+    """Compact, array-backed adjacency structure for an undirected ``MultiGraph``,
+    stored in compressed sparse row (CSR) format.
+
+    The node ids of the input graph (e.g. OSM ids) are remapped to dense indices ``0 .. n-1``.
+    The incident edges of the node with index ``i`` are stored in the slots
+    ``offsets[i]`` up to (but not including) ``offsets[i + 1]`` of the ``neighbors``, ``keys``
+    and ``lengths`` arrays. Every edge is stored once from each of its ends
+    (a self-loop is stored only once), in the same order as ``graph_utils.get_incident_edges``.
+
+    :ivar node_ids: The original node id for each node index
+    :ivar offsets: Start of each node's slots, with one extra entry at the end
+    :ivar neighbors: For each slot, the index of the node at the other end of the edge
+    :ivar keys: For each slot, the key of the edge
+    :ivar lengths: For each slot, the length of the edge
+    :ivar x: The x coordinate (longitude) of each node, or None if the graph has no coordinates
+    :ivar y: The y coordinate (latitude) of each node, or None if the graph has no coordinates
+    :ivar crs: Coordinate reference system of the coordinates, if known
+    :ivar index: Dictionary that maps an original node id to its node index
+        (built the first time it is used, so that loading a large snapshot stays cheap)
+    """
+    # arrays saved in a snapshot directory, one .npy file each
+    _arrays = ['node_ids', 'offsets', 'neighbors', 'keys', 'lengths', 'x', 'y']
+
+    def __init__(self, node_ids: np.ndarray, offsets: np.ndarray, neighbors: np.ndarray,
+                 keys: np.ndarray, lengths: np.ndarray, x: Optional[np.ndarray] = None,
+                 y: Optional[np.ndarray] = None, crs: Optional[str] = None) -> None:
+        """Create a CSRGraph from its arrays. Use ``from_networkx`` to build one from a graph.
+
+        :param node_ids: The original node id for each node index
+        :type node_ids: ndarray
+        :param offsets: Start of each node's slots, with one extra entry at the end
+        :type offsets: ndarray
+        :param neighbors: For each slot, the index of the node at the other end of the edge
+        :type neighbors: ndarray
+        :param keys: For each slot, the key of the edge
+        :type keys: ndarray
+        :param lengths: For each slot, the length of the edge
+        :type lengths: ndarray
+        :param x: The x coordinate (longitude) of each node
+        :type x: ndarray, optional
+        :param y: The y coordinate (latitude) of each node
+        :type y: ndarray, optional
+        :param crs: Coordinate reference system of the coordinates
+        :type crs: str, optional
+        """
+        self.node_ids = node_ids
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.keys = keys
+        self.lengths = lengths
+        self.x = x
+        self.y = y
+        self.crs = crs
+        self._index: Optional[Dict[int, int]] = None
+        # index of the shortest edge between each pair of nodes,
+        # built by shortest_slots when first needed
+        self._pair_codes: Optional[np.ndarray] = None
+        self._pair_slots: Optional[np.ndarray] = None
+        self._edge_hashes: Optional[np.ndarray] = None
+        self._fingerprint: Optional[str] = None
+
+    def __getstate__(self) -> dict:
+        # the indexes are rebuilt from the arrays after unpickling, which keeps pickles small
+        state = self.__dict__.copy()
+        state['_index'] = state['_pair_codes'] = state['_pair_slots'] = state['_edge_hashes'] = None
+        return state
+
+    @property
+    def index(self) -> Dict[int, int]:
+        if self._index is None:
+            self._index = {n: i for i, n in enumerate(self.node_ids.tolist())}
+        return self._index
+
+    @classmethod
+    def from_networkx(cls, G: nx.MultiGraph) -> "CSRGraph":
+        """Build a CSRGraph from an undirected ``MultiGraph`` whose edges have a ``length``
+        attribute. If every node has ``x`` and ``y`` attributes (as in graphs from ``osmnx``),
+        they are kept as well.
+
+        :param G: Input graph
+        :type G: MultiGraph
+        :return: Array-backed copy of the graph's adjacency and edge lengths
+        :rtype: CSRGraph
+        """
+        n = G.number_of_nodes()
+        node_ids = np.fromiter(G.nodes, dtype=np.int64, count=n)
+        index = {u: i for i, u in enumerate(node_ids.tolist())}
+
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        neighbors: List[int] = []
+        keys: List[int] = []
+        lengths: List[float] = []
+        for i, u in enumerate(node_ids.tolist()):
+            for _, v, k, length in G.edges(nbunch=u, data='length', keys=True):
+                neighbors.append(index[v])
+                keys.append(k)
+                lengths.append(length)
+            offsets[i + 1] = len(neighbors)
+
+        x = y = None
+        if n > 0 and all('x' in data and 'y' in data for data in G.nodes.values()):
+            x = np.fromiter((data['x'] for data in G.nodes.values()), dtype=np.float64, count=n)
+            y = np.fromiter((data['y'] for data in G.nodes.values()), dtype=np.float64, count=n)
+
+        index_type = np.int32 if n < np.iinfo(np.int32).max else np.int64
+        return cls(node_ids,
+                   offsets,
+                   np.array(neighbors, dtype=index_type),
+                   np.array(keys, dtype=np.int32),
+                   np.array(lengths, dtype=np.float64),
+                   x=x, y=y, crs=G.graph.get('crs'))
+
+    def to_networkx(self) -> nx.MultiGraph:
+        """Build an undirected ``MultiGraph`` with the same nodes, edges and lengths
+        (and node coordinates, if there are any).
+
+        :return: The graph as a ``MultiGraph``
+        :rtype: MultiGraph
+        """
+        G = nx.MultiGraph()
+        if self.crs is not None:
+            G.graph['crs'] = self.crs
+
+        node_ids = self.node_ids.tolist()
+        if self.x is None:
+            G.add_nodes_from(node_ids)
+        else:
+            G.add_nodes_from((n, {'x': x, 'y': y})
+                             for n, x, y in zip(node_ids, self.x.tolist(), self.y.tolist()))
+
+        neighbors = self.neighbors.tolist()
+        keys = self.keys.tolist()
+        lengths = self.lengths.tolist()
+        for i in range(self.number_of_nodes()):
+            for s in self.slots(i):
+                if i <= neighbors[s]:  # every edge is stored from both ends, add it once
+                    G.add_edge(node_ids[i], node_ids[neighbors[s]], key=keys[s], length=lengths[s])
+        return G
+
+    def save(self, path: str) -> None:
+        """Save the graph as a snapshot: a directory with one ``.npy`` file per array,
+        which can be loaded again quickly with ``load``.
+
+        :param path: Path of the snapshot directory (created if it does not exist)
+        :type path: str
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in self._arrays:
+            array = getattr(self, name)
+            if array is not None:
+                np.save(os.path.join(path, name + '.npy'), array)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'crs': self.crs}, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "CSRGraph":
+        """Load a snapshot that was saved with ``save``.
+
+        :param path: Path of the snapshot directory
+        :type path: str
+        :param mmap: If True, the arrays are memory-mapped instead of read into memory
+        :type mmap: bool
+        :return: The loaded graph
+        :rtype: CSRGraph
+        """
+        arrays = {}
+        for name in cls._arrays:
+            file = os.path.join(path, name + '.npy')
+            if os.path.exists(file):
+                arrays[name] = np.load(file, mmap_mode='r' if mmap else None)
+            else:
+                arrays[name] = None
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        return cls(**arrays, crs=meta['crs'])
+
+    def subgraph(self, nodes: np.ndarray) -> "CSRGraph":
+        """Build the subgraph made of some of the nodes, and all the edges between them.
+        Only the slots of those nodes are read, so this is cheap for a few nodes of a large
+        memory-mapped graph. The incident edges of each node keep their order.
+
+        :param nodes: Indices of the nodes to keep (without duplicates), which become
+            node indices ``0 .. len(nodes)-1`` of the subgraph in the same order
+        :type nodes: ndarray
+        :return: The subgraph
+        :rtype: CSRGraph
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        starts = np.asarray(self.offsets[nodes], dtype=np.int64)
+        counts = np.asarray(self.offsets[nodes + 1], dtype=np.int64) - starts
+
+        # every slot of the kept nodes, in order
+        first = np.zeros(len(nodes), dtype=np.int64)
+        np.cumsum(counts[:-1], out=first[1:])
+        slots = np.repeat(starts - first, counts) + np.arange(int(counts.sum()), dtype=np.int64)
+
+        # new index of the neighbor in each slot, and whether the neighbor is kept at all
+        order = np.argsort(nodes, kind='stable')
+        sorted_nodes = nodes[order]
+        neighbors = np.asarray(self.neighbors[slots], dtype=np.int64)
+        pos = np.searchsorted(sorted_nodes, neighbors)
+        pos[pos == len(nodes)] = 0
+        keep = sorted_nodes[pos] == neighbors if len(nodes) else np.zeros(0, dtype=bool)
+
+        owner = np.repeat(np.arange(len(nodes)), counts)
+        offsets = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(owner[keep], minlength=len(nodes)), out=offsets[1:])
+
+        slots = slots[keep]
+        return CSRGraph(np.asarray(self.node_ids[nodes]),
+                        offsets,
+                        order[pos[keep]].astype(self.neighbors.dtype),
+                        np.asarray(self.keys[slots]),
+                        np.asarray(self.lengths[slots]),
+                        x=None if self.x is None else np.asarray(self.x[nodes]),
+                        y=None if self.y is None else np.asarray(self.y[nodes]),
+                        crs=self.crs)
+
+    def ball(self, source: int, radius: float) -> Tuple["CSRGraph", np.ndarray]:
+        """Build the subgraph of the nodes no farther than some distance from a source node,
+        e.g. the only nodes a route of twice that distance from the source can go through.
+
+        :param source: Index of the source node
+        :type source: int
+        :param radius: Largest distance from the source
+        :type radius: float
+        :return: The subgraph, and the distance from the source of each of its nodes
+        :rtype: Tuple[CSRGraph, ndarray]
+        """
+        distance = self.single_source_dijkstra(source, cutoff=radius)
+        nodes = np.flatnonzero(np.isfinite(distance))
+        return self.subgraph(nodes), distance[nodes]
+
+    def edge_slots(self, i: int, j: int, key: int) -> List[int]:
+        """Find the slots that hold an edge (one at each end, or a single one for a self-loop).
+
+        :param i: Index of one end of the edge
+        :type i: int
+        :param j: Index of the other end of the edge
+        :type j: int
+        :param key: Key of the edge
+        :type key: int
+        :return: Slots of the edge
+        :rtype: List[int]
+        :raises KeyError: If there is no such edge
+        """
+        slots = []
+        for a, b in ((i, j),) if i == j else ((i, j), (j, i)):
+            lo, hi = int(self.offsets[a]), int(self.offsets[a + 1])
+            found = np.flatnonzero((self.neighbors[lo:hi] == b) & (self.keys[lo:hi] == key))
+            if len(found) == 0:
+                raise KeyError((int(self.node_ids[i]), int(self.node_ids[j]), key))
+            slots.append(lo + int(found[0]))
+        return slots
+
+    def edge_length(self, i: int, j: int) -> float:
+        """Return the length of the shortest edge between two nodes.
+
+        :param i: Index of one node
+        :type i: int
+        :param j: Index of the other node
+        :type j: int
+        :return: Length of the shortest edge, or ``inf`` if there is no edge between them
+        :rtype: float
+        """
+        lo, hi = int(self.offsets[i]), int(self.offsets[i + 1])
+        lengths = self.lengths[lo:hi][self.neighbors[lo:hi] == j]
+        return float(lengths.min()) if len(lengths) else math.inf
+
+    def with_edge_changes(self, lengths: Optional[Dict[int, float]] = None,
+                          removed: Optional[Iterable[int]] = None,
+                          copy: bool = True) -> "CSRGraph":
+        """Build a copy of the graph with some edges reweighted or removed.
+        This graph is not modified (it may be shared, or memory-mapped read-only):
+        only the lengths are copied, and the other arrays too if edges are removed.
+        The incident edges of each node keep their order, and the index of the nodes
+        (and the edge hashes, if no edges are removed) is shared with the copy.
+
+        :param lengths: New length for some slots (both slots of an edge should be given)
+        :type lengths: Dict[int, float], optional
+        :param removed: Slots of the edges to remove (both slots of an edge should be given)
+        :type removed: Iterable[int], optional
+        :param copy: If False, and no edges are removed, the lengths of this graph are changed
+            in place, so that only the changed slots are written. Only for a graph that is not
+            shared, e.g. one built by an earlier call.
+        :type copy: bool
+        :return: The changed graph
+        :rtype: CSRGraph
+        """
+        removed = np.unique(np.fromiter(removed if removed is not None else [], dtype=np.int64))
+        if copy or len(removed):
+            changed = CSRGraph(self.node_ids, self.offsets, self.neighbors, self.keys,
+                               np.array(self.lengths, dtype=np.float64),
+                               x=self.x, y=self.y, crs=self.crs)
+            changed._index = self._index
+            changed._edge_hashes = self._edge_hashes
+        else:
+            changed = self
+        if lengths:
+            changed.lengths[np.fromiter(lengths.keys(), dtype=np.int64)] = list(lengths.values())
+            # (the shortest edge between two nodes may have changed)
+            changed._pair_codes = changed._pair_slots = changed._fingerprint = None
+
+        if len(removed):
+            keep = np.ones(len(changed.lengths), dtype=bool)
+            keep[removed] = False
+            changed.offsets = np.asarray(self.offsets) - np.searchsorted(removed, self.offsets)
+            changed.neighbors = np.asarray(self.neighbors)[keep]
+            changed.keys = np.asarray(self.keys)[keep]
+            changed.lengths = changed.lengths[keep]
+            changed._pair_codes = changed._pair_slots = changed._edge_hashes = None
+        return changed
+
+    def repair_distances(self, distance: np.ndarray, source: int,
+                         changed: List[Tuple[int, int, float]],
+                         cutoff: Optional[float] = None) -> List[int]:
+        """Update, in place, the distances from a source node (as computed by
+        ``single_source_dijkstra`` with the same cutoff) after the edges between some pairs of nodes
+        changed, without computing them again from scratch. Only the affected part of the graph
+        is searched:
+
+        * the nodes whose every shortest path used an edge that got longer (or was removed)
+          are found by following the edges that are on shortest paths outwards from the changed
+          edges, and their distances are computed again, starting from the unaffected nodes
+          around them
+        * from the ends of the edges that got shorter (or were added), the nodes that got closer
+          are found as by Dijkstra's algorithm, which stops where distances no longer improve
+
+        :param distance: Distances from the source before the change, indexed by node index,
+            with ``inf`` for nodes not reached
+        :type distance: ndarray
+        :param source: Index of the source node
+        :type source: int
+        :param changed: For each pair of nodes whose edges changed, the indices of the two nodes
+            and the length of the shortest edge between them before the change
+            (``inf`` if there was none). This graph must already have the new edges.
+        :type changed: List[Tuple[int, int, float]]
+        :param cutoff: Nodes farther than this distance are not reached
+        :type cutoff: float, optional
+        :return: Indices of the nodes whose distance was computed again
+        :rtype: List[int]
+        """
+        if cutoff is None:
+            cutoff = math.inf
+        changed = [(i, j, old, self.edge_length(i, j)) for i, j, old in changed]
+        longer = [(i, j, old) for i, j, old, new in changed if new > old]
+        shorter = [(i, j, new) for i, j, old, new in changed if new < old]
+        affected = self._lost_shortest_paths(distance, source, longer)
+        heap = self._restart_points(distance, affected, shorter, cutoff)
+        return sorted(affected | self._improve_distances(distance, heap, cutoff))
+
+    def _lost_shortest_paths(self, distance: np.ndarray, source: int,
+                             longer: List[Tuple[int, int, float]]) -> Set[int]:
+        # The nodes whose every shortest path used one of the edges that got longer (given by
+        # their ends and old length). Nodes are checked in order of their distance, so that
+        # whether a node is affected is always decided before the nodes beyond it.
+        offsets = self.offsets
+        neighbors = self.neighbors
+        lengths = self.lengths
+
+        candidates = [(float(distance[b]), b) for i, j, old in longer for a, b in ((i, j), (j, i))
+                      if b != source and _on_shortest_path(distance[a], old, distance[b])]
+        heapq.heapify(candidates)
+        affected = set()
+        checked = set()
+        while candidates:
+            d, b = heapq.heappop(candidates)
+            if b in checked:
+                continue
+            checked.add(b)
+            lo, hi = int(offsets[b]), int(offsets[b + 1])
+            edges = list(zip(neighbors[lo:hi].tolist(), lengths[lo:hi].tolist()))
+            if any(a != b and a not in affected and _on_shortest_path(distance[a], length, d)
+                   for a, length in edges):
+                continue  # there is still a shortest path through an unaffected node
+            affected.add(b)
+            for c, length in edges:
+                if c not in checked and c != source and _on_shortest_path(d, length, distance[c]):
+                    heapq.heappush(candidates, (float(distance[c]), c))
+        return affected
+
+    def _restart_points(self, distance: np.ndarray, affected: Set[int],
+                        shorter: List[Tuple[int, int, float]],
+                        cutoff: float) -> List[Tuple[float, int]]:
+        # Forget the distances of the affected nodes, and find where Dijkstra's algorithm starts
+        # again: the affected nodes, from their unaffected neighbors, and the ends of the edges
+        # that got shorter (given by their ends and new length), from their other end
+        offsets = self.offsets
+        neighbors = self.neighbors
+        lengths = self.lengths
+
+        for b in affected:
+            distance[b] = math.inf
+        heap = []
+        for b in affected:
+            lo, hi = int(offsets[b]), int(offsets[b + 1])
+            d = min((distance[a] + length
+                     for a, length in zip(neighbors[lo:hi].tolist(), lengths[lo:hi].tolist())),
+                    default=math.inf)
+            if d <= cutoff:
+                distance[b] = d
+                heap.append((float(d), b))
+        for i, j, new in shorter:
+            for a, b in ((i, j), (j, i)):
+                d = distance[a] + new
+                if d <= cutoff and d < distance[b]:
+                    distance[b] = d
+                    heap.append((float(d), b))
+        return heap
+
+    def _improve_distances(self, distance: np.ndarray, heap: List[Tuple[float, int]],
+                           cutoff: float) -> Set[int]:
+        # Dijkstra's algorithm from the given (distance, node index) pairs, for as long as distances
+        # improve, returning the nodes it settled
+        offsets = self.offsets
+        neighbors = self.neighbors
+        lengths = self.lengths
+
+        heapq.heapify(heap)
+        settled = set()
+        while heap:
+            d, i = heapq.heappop(heap)
+            if d > distance[i]:
+                continue  # reached again by a shorter path since it was pushed
+            settled.add(i)
+            lo, hi = int(offsets[i]), int(offsets[i + 1])
+            for j, length in zip(neighbors[lo:hi].tolist(), lengths[lo:hi].tolist()):
+                dj = d + length
+                if dj <= cutoff and dj < distance[j]:
+                    distance[j] = dj
+                    heapq.heappush(heap, (dj, j))
+        return settled
+
+    def number_of_nodes(self) -> int:
+        """Return the number of nodes in the graph.
+
+        :return: Number of nodes
+        :rtype: int
+        """
+        return len(self.node_ids)
+
+    def slots(self, i: int) -> range:
+        """Return the slots that hold the incident edges of a node.
+
+        :param i: Node index
+        :type i: int
+        :return: Range of slot positions
+        :rtype: range
+        """
+        return range(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def edge(self, i: int, s: int) -> Edge:
+        """Build the ``Edge`` stored in a slot, using original node ids.
+
+        :param i: Index of the node the slot belongs to
+        :type i: int
+        :param s: Slot position
+        :type s: int
+        :return: The edge, starting at node ``i``
+        :rtype: Edge
+        """
+        return Edge(int(self.node_ids[i]), int(self.node_ids[self.neighbors[s]]),
+                    int(self.keys[s]), float(self.lengths[s]))
+
+    def incident_edges(self, u: int) -> List[Edge]:
+        """For an input node, get a list of all the incident edges
+        (all edges that start at the input node). Same as ``graph_utils.get_incident_edges``.
+
+        :param u: Node (original node id)
+        :type u: int
+        :return: List of edges that are incident on this node
+        :rtype: List[Edge]
+        """
+        lo, hi = self.offsets[self.index[u]], self.offsets[self.index[u] + 1]
+        vs = self.node_ids[self.neighbors[lo:hi]].tolist()
+        keys = self.keys[lo:hi].tolist()
+        lengths = self.lengths[lo:hi].tolist()
+        return [Edge(u, v, k, length) for v, k, length in zip(vs, keys, lengths)]
+
+    def _build_pair_index(self) -> None:
+        # one code per slot for the (node index, neighbor index) pair it connects,
+        # and for each distinct code (sorted), the slot of the shortest edge with that code
+        n = self.number_of_nodes()
+        owner = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.offsets))
+        codes = owner * n + self.neighbors
+        # sorted by code, then by length;
+        # the sort is stable, so of equally short edges the first is kept
+        order = np.lexsort((self.lengths, codes))
+        sorted_codes = codes[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = sorted_codes[1:] != sorted_codes[:-1]
+        self._pair_codes = sorted_codes[first]
+        self._pair_slots = order[first]
+
+    def shortest_slots(self, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        """For each pair of node indices, find the slot of the shortest edge between them,
+        stored from the end ``i``. The index used for this is built once, the first time it is
+        needed, and after that each pair is a single lookup.
+
+        :param i: Node indices at the start of the edges
+        :type i: ndarray
+        :param j: Node indices at the end of the edges
+        :type j: ndarray
+        :return: Slot of the shortest edge from each node in ``i`` to the node in ``j``
+        :rtype: ndarray
+        :raises KeyError: If there is no edge between one of the pairs of nodes
+        """
+        if self._pair_codes is None:
+            self._build_pair_index()
+        n = self.number_of_nodes()
+        codes = np.asarray(i, dtype=np.int64) * n + np.asarray(j, dtype=np.int64)
+        pos = np.searchsorted(self._pair_codes, codes)
+        pos[pos == len(self._pair_codes)] = 0
+        missing = self._pair_codes[pos] != codes
+        if missing.any():
+            k = int(np.argmax(missing))
+            raise KeyError((int(self.node_ids[i[k]]), int(self.node_ids[j[k]])))
+        return self._pair_slots[pos]
+
+    def edge_hashes(self) -> np.ndarray:
+        """Return a hash of the edge in each slot, which is the same for both slots of an edge.
+        The hashes look random, so the sum of the hashes of some edges (modulo 2**64) identifies
+        which edges they are, with a negligible chance of collisions, whatever their order
+        (Zobrist hashing). The hashes are computed the first time they are needed.
+
+        :return: Array of 64-bit hashes indexed by slot
+        :rtype: ndarray
+        """
+        if self._edge_hashes is None:
+            n = self.number_of_nodes()
+            owner = np.repeat(np.arange(n, dtype=np.uint64), np.diff(self.offsets))
+            other = self.neighbors.astype(np.uint64)
+            pair = np.minimum(owner, other) * np.uint64(n) + np.maximum(owner, other)
+            self._edge_hashes = _mix(_mix(pair) ^ self.keys.astype(np.uint64))
+        return self._edge_hashes
+
+    def fingerprint(self) -> str:
+        """Return a hash of the graph's nodes, edges and lengths, which changes whenever any of them
+        change (e.g. to recognize results computed for the same graph).
+        It is computed the first time it is needed.
+
+        :return: Hexadecimal hash
+        :rtype: str
+        """
+        if self._fingerprint is None:
+            h = hashlib.blake2b(digest_size=20)
+            for name in ['node_ids', 'offsets', 'neighbors', 'keys', 'lengths']:
+                array = np.ascontiguousarray(getattr(self, name))
+                h.update(f'{name}:{array.dtype.str}:{len(array)};'.encode())
+                h.update(array.data)
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    def edges_from_path(self, path: List[int]) -> List[Edge]:
+        """Translates a path given as a list of nodes into a list of edges.
+        If there are parallel edges, always use the shortest edge available.
+        Same as ``graph_utils.get_edges_from_path``.
+
+        :param path: Path given as a list of nodes (original node ids)
+        :type path: List[int]
+        :return: List of edges corresponding to the shortest path visiting the same nodes in order.
+        :rtype: List[Edge]
+        """
+        if len(path) < 2:
+            return []
+        nodes = np.fromiter((self.index[u] for u in path), dtype=np.int64, count=len(path))
+        slots = self.shortest_slots(nodes[:-1], nodes[1:])
+        keys = self.keys[slots].tolist()
+        lengths = self.lengths[slots].tolist()
+        return [Edge(u, v, k, length)
+                for u, v, k, length in zip(path[:-1], path[1:], keys, lengths)]
+
+    def iter_dijkstra(self, source: int, cutoff: Optional[float] = None,
+                      pred: Optional[Dict[int, int]] = None,
+                      onward_distance: Optional[np.ndarray] = None) -> Iterator[Tuple[int, float]]:
+        """Run Dijkstra's algorithm from a source node, yielding each node as it is settled,
+        in order of increasing distance. Stopping the iteration early stops the search.
+
+        :param source: Index of the source node
+        :type source: int
+        :param cutoff: Nodes farther than this distance are not reached
+        :type cutoff: float, optional
+        :param pred: If given, filled in with the slot used to reach each node
+            (other than the source)
+        :type pred: Dict[int, int], optional
+        :param onward_distance: If given (together with ``cutoff``), a lower bound on the distance
+            that still has to be covered after each node, indexed by node index.
+            Nodes whose distance plus onward distance is more than the cutoff are not reached.
+        :type onward_distance: ndarray, optional
+        :return: Iterator of (node index, distance) pairs
+        :rtype: Iterator[Tuple[int, float]]
+        """
+        offsets = self.offsets
+        neighbors = self.neighbors
+        lengths = self.lengths
+
+        settled = set()
+        seen = {source: 0.0}
+        counter = itertools.count()  # breaks ties in the order nodes were reached
+        heap = [(0.0, next(counter), source)]
+        while heap:
+            d, _, i = heapq.heappop(heap)
+            if i in settled:
+                continue
+            settled.add(i)
+            yield i, d
+
+            lo, hi = int(offsets[i]), int(offsets[i + 1])
+            for s, j, length in zip(range(lo, hi), neighbors[lo:hi].tolist(),
+                                    lengths[lo:hi].tolist()):
+                if j in settled:
+                    continue
+                dj = d + length
+                if cutoff is not None and dj > cutoff:
+                    continue
+                if onward_distance is not None and dj + onward_distance[j] > cutoff:
+                    continue
+                if j not in seen or dj < seen[j]:
+                    seen[j] = dj
+                    heapq.heappush(heap, (dj, next(counter), j))
+                    if pred is not None:
+                        pred[j] = s
+
+    def single_source_dijkstra(self, source: int, cutoff: Optional[float] = None) -> np.ndarray:
+        """Find the distance of every node from a source node.
+
+        :param source: Index of the source node
+        :type source: int
+        :param cutoff: Nodes farther than this distance are not reached
+        :type cutoff: float, optional
+        :return: Array of distances indexed by node index, with ``inf`` for nodes not reached
+        :rtype: ndarray
+        """
+        distance = np.full(self.number_of_nodes(), np.inf)
+        for i, d in self.iter_dijkstra(source, cutoff=cutoff):
+            distance[i] = d
+        return distance
+
+    def path_from_pred(self, pred: Dict[int, int], source: int, target: int) -> List[int]:
+        """Follow the slots recorded by ``iter_dijkstra`` back from a target node to the source,
+        and return the path as a list of original node ids.
+
+        :param pred: Slot used to reach each node, as filled in by ``iter_dijkstra``
+        :type pred: Dict[int, int]
+        :param source: Index of the source node of the search
+        :type source: int
+        :param target: Index of the target node
+        :type target: int
+        :return: Path from source to target, as a list of original node ids
+        :rtype: List[int]
+        """
+        path = [target]
+        i = target
+        while i != source:
+            # the node that owns the slot
+            i = int(np.searchsorted(self.offsets, pred[i], side='right')) - 1
+            path.append(i)
+        path.reverse()
+        return self.node_ids[path].tolist()
+
+    def _lower_bound(self, target: int) -> Optional[Callable[[int], float]]:
+        # A lower bound on the distance from each node to the target, from the node coordinates,
+        # or None if there is none: coordinates in longitude/latitude give great-circle distances
+        # in meters (as the edge lengths from osmnx), and projected coordinates straight-line
+        # distances.
+        # Without a crs the units of the coordinates are unknown, so they are not used.
+        if self.x is None or self.crs is None:
+            return None
+        x, y = self.x, self.y
+        tx, ty = float(x[target]), float(y[target])
+
+        if str(self.crs).lower() in _GEOGRAPHIC_CRS:
+            cos_ty = math.cos(math.radians(ty))
+
+            def great_circle(i: int) -> float:
+                lat = math.radians(float(y[i]))
+                a = (math.sin((lat - math.radians(ty)) / 2) ** 2
+                     + math.cos(lat) * cos_ty * math.sin(math.radians(float(x[i]) - tx) / 2) ** 2)
+                return _BOUND_SCALE * 2 * _EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+            return great_circle
+
+        def straight_line(i: int) -> float:
+            return _BOUND_SCALE * math.hypot(float(x[i]) - tx, float(y[i]) - ty)
+        return straight_line
+
+    def shortest_path(self, source: int, target: int,
+                      cutoff: Optional[float] = None) -> Tuple[float, List[int]]:
+        """Find a shortest path between two nodes.
+
+        If the graph has coordinates and a crs, this is an A* search guided by the straight-line
+        (or great-circle) distance to the target, which is never more than the length of a path
+        there.
+        Otherwise it is a bidirectional Dijkstra search, from both ends at once.
+        Either way far fewer nodes are settled than by a Dijkstra search from the source.
+
+        A ``RouteFinder`` uses it only for ``path_to_source``, which closes the route of
+        ``anytime_route`` when its budget runs out. Its other searches are not between two given
+        nodes: ``path_to_next_node`` looks for the nearest unvisited node (which Dijkstra's
+        algorithm finds first), and viable edges are checked against the distance table.
+
+        :param source: Index of the source node
+        :type source: int
+        :param target: Index of the target node
+        :type target: int
+        :param cutoff: Only look for paths up to this distance
+        :type cutoff: float, optional
+        :return: Length of the path, and the path as a list of original node ids
+        :rtype: Tuple[float, List[int]]
+        :raises NetworkXNoPath: If there is no path (within the cutoff)
+        """
+        if source == target:
+            return 0.0, [int(self.node_ids[source])]
+        bound = self._lower_bound(target)
+        if bound is None:
+            distance, path = self._bidirectional_dijkstra(source, target, cutoff)
+        else:
+            distance, path = self._astar(source, target, bound, cutoff)
+        return distance, self.node_ids[path].tolist()
+
+    def _astar(self, source: int, target: int, bound: Callable[[int], float],
+               cutoff: Optional[float]) -> Tuple[float, List[int]]:
+        offsets = self.offsets
+        neighbors = self.neighbors
+        lengths = self.lengths
+
+        parent: Dict[int, int] = {}
+        seen = {source: 0.0}
+        settled = set()
+        counter = itertools.count()
+        heap = [(bound(source), next(counter), 0.0, source)]
+        while heap:
+            _, _, d, i = heapq.heappop(heap)
+            if i in settled:
+                continue
+            if i == target:
+                path = [target]
+                while path[-1] != source:
+                    path.append(parent[path[-1]])
+                path.reverse()
+                return d, path
+            settled.add(i)
+
+            lo, hi = int(offsets[i]), int(offsets[i + 1])
+            for j, length in zip(neighbors[lo:hi].tolist(), lengths[lo:hi].tolist()):
+                if j in settled:
+                    continue
+                dj = d + length
+                if cutoff is not None and dj > cutoff:
+                    continue
+                if j not in seen or dj < seen[j]:
+                    seen[j] = dj
+                    parent[j] = i
+                    heapq.heappush(heap, (dj + bound(j), next(counter), dj, j))
+        raise nx.NetworkXNoPath(f'No path between {self.node_ids[source]} '
+                                f'and {self.node_ids[target]}.')
+
+    def _bidirectional_dijkstra(self, source: int, target: int,
+                                cutoff: Optional[float]) -> Tuple[float, List[int]]:
+        counter = itertools.count()
+        forward, backward = _Frontier(source, counter), _Frontier(target, counter)
+
+        # shortest path found so far, and the node where its two halves meet
+        best, meet = math.inf, None
+        while forward.heap and backward.heap:
+            # no path through a node not yet settled on either side can be shorter than this
+            if forward.heap[0][0] + backward.heap[0][0] >= best:
+                break
+            if forward.heap[0][0] <= backward.heap[0][0]:
+                best, meet = self._settle_next(forward, backward, cutoff, best, meet)
+            else:
+                best, meet = self._settle_next(backward, forward, cutoff, best, meet)
+
+        if meet is None or (cutoff is not None and best > cutoff):
+            raise nx.NetworkXNoPath(f'No path between {self.node_ids[source]} '
+                                    f'and {self.node_ids[target]}.')
+        path = forward.path_back(meet)
+        path.reverse()
+        return best, path + backward.path_back(meet)[1:]
+
+    def _settle_next(self, frontier: "_Frontier", other: "_Frontier", cutoff: Optional[float],
+                     best: float, meet: Optional[int]) -> Tuple[float, Optional[int]]:
+        # One step of _bidirectional_dijkstra on one side: settle the next node and relax its edges.
+        # Returns the shortest path found so far (its length, and the node where its halves meet).
+        d, _, i = heapq.heappop(frontier.heap)
+        if i in frontier.settled:
+            return best, meet
+        frontier.settled.add(i)
+
+        lo, hi = int(self.offsets[i]), int(self.offsets[i + 1])
+        for j, length in zip(self.neighbors[lo:hi].tolist(), self.lengths[lo:hi].tolist()):
+            if j in frontier.settled:
+                continue
+            dj = d + length
+            if cutoff is not None and dj > cutoff:
+                continue
+            if j not in frontier.seen or dj < frontier.seen[j]:
+                frontier.seen[j] = dj
+                frontier.parent[j] = i
+                heapq.heappush(frontier.heap, (dj, next(frontier.counter), j))
+                if j in other.seen and dj + other.seen[j] < best:
+                    best, meet = dj + other.seen[j], j
+        return best, meet
+
+
+class _Frontier():
+    """One side of ``CSRGraph._bidirectional_dijkstra``: a Dijkstra search from one end of the path.
+    """
+    def __init__(self, start: int, counter: Iterator[int]) -> None:
+        self.start = start
+        # shared by both sides, breaks ties in the order nodes were reached
+        self.counter = counter
+        self.seen: Dict[int, float] = {start: 0.0}
+        self.parent: Dict[int, int] = {}
+        self.settled: Set[int] = set()
+        self.heap = [(0.0, next(counter), start)]
+
+    def path_back(self, i: int) -> List[int]:
+        # path from a node reached by the search back to where it started
+        path = [i]
+        while path[-1] != self.start:
+            path.append(self.parent[path[-1]])
+        return path
+
+
+def _on_shortest_path(d_from: float, length: float, d_to: float) -> bool:
+    # whether an edge is on a shortest path to its end, given the distances of its two ends
+    # (distances summed along different paths of the same length may differ by rounding)
+    return math.isfinite(d_to) and d_from + length <= d_to + 1e-9 * max(1.0, d_to)
+
+
+def _mix(h: np.ndarray) -> np.ndarray:
+    # the splitmix64 finalizer: maps 64-bit integers to well spread out 64-bit hashes
+    # (wrapping on overflow)
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return h ^ (h >> np.uint64(31))
+
+
+# coordinate reference systems with coordinates in degrees of longitude (x) and latitude (y)
+_GEOGRAPHIC_CRS = {'epsg:4326', 'wgs84', 'wgs 84'}
+# mean earth radius in meters, as used by osmnx for edge lengths
+_EARTH_RADIUS_M = 6371009
+# lower bounds are scaled down slightly,
+# so that edge lengths rounded down by osmnx never make them too large
+_BOUND_SCALE = 0.999
+
+# CSR graphs already built, so that many finders over one loaded graph share a single copy
+_csr_graphs: "weakref.WeakKeyDictionary[nx.MultiGraph, CSRGraph]" = weakref.WeakKeyDictionary()
+
+
+def get_csr_graph(G: nx.MultiGraph) -> CSRGraph:
+    """Return the CSRGraph for an input graph, building it the first time it is asked for.
+    The input graph is treated as read-only: changes made to it afterwards are not picked up.
+
+    :param G: Input graph
+    :type G: MultiGraph
+    :return: Array-backed copy of the graph, shared by every caller that passes the same graph
+    :rtype: CSRGraph
+    """
+    csr = _csr_graphs.get(G)
+    if csr is None:
+        csr = CSRGraph.from_networkx(G)
+        _csr_graphs[G] = csr
+    return csr
@@ -1,4 +1,5 @@
-from typing import NamedTuple, List
+import numpy as np
+from typing import NamedTuple, List, Tuple
 
 
 class Edge(NamedTuple):
@@ -48,3 +49,57 @@ def shortest_edge(edges: List[Edge]) -> Edge:
     :rtype: Edge
     """
     return min(edges, key=lambda e: e.length)
+
+
+def _flatten(edge_lists: List[List[Edge]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # lengths of all edges in one array, and the start and size of each list within it
+    counts = np.fromiter((len(edges) for edges in edge_lists), dtype=np.int64,
+                         count=len(edge_lists))
+    starts = np.zeros(len(edge_lists), dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    lengths = np.fromiter((e.length for edges in edge_lists for e in edges), dtype=np.float64,
+                          count=int(counts.sum()))
+    return lengths, starts, counts
+
+
+def total_lengths(edge_lists: List[List[Edge]]) -> np.ndarray:
+    """Calculate the total length of each of many lists of edges (e.g. the edges of many routes).
+    Same as calling ``total_length`` on each list.
+
+    :param edge_lists: A list of lists of edges
+    :type edge_lists: List[List[Edge]]
+    :return: Array with the sum of the lengths of each list of edges
+    :rtype: ndarray
+    """
+    lengths, starts, counts = _flatten(edge_lists)
+    # the lists sorted from longest to shortest, so that the ones with a k-th edge come first,
+    # and then the k-th edge of each is added, for one k after the other: the same additions
+    # in the same order as total_length, so the results are exactly the same
+    order = np.argsort(-counts, kind='stable')
+    starts, counts = starts[order], counts[order]
+    sorted_totals = np.zeros(len(edge_lists))
+    for k in range(int(counts[0]) if len(counts) else 0):
+        m = int(np.searchsorted(-counts, -k, side='left'))  # number of lists with more than k edges
+        sorted_totals[:m] += lengths[starts[:m] + k]
+    totals = np.zeros(len(edge_lists))
+    totals[order] = sorted_totals
+    return totals
+
+
+def shortest_edges(edge_lists: List[List[Edge]]) -> List[Edge]:
+    """Return the shortest edge from each of many lists of edges.
+    Same as calling ``shortest_edge`` on each list.
+
+    :param edge_lists: A list of non-empty lists of edges
+    :type edge_lists: List[List[Edge]]
+    :return: The shortest edge of each list
+    :rtype: List[Edge]
+    """
+    lengths, starts, counts = _flatten(edge_lists)
+    if (counts == 0).any():
+        raise ValueError('shortest_edges() arg contains an empty list')
+    segment = np.repeat(np.arange(len(edge_lists)), counts)
+    # sort by list, then by length (a stable sort, so the first of equally short edges is kept)
+    order = np.lexsort((lengths, segment))
+    shortest = order[starts] - starts
+    return [edges[k] for edges, k in zip(edge_lists, shortest.tolist())]
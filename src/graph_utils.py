@@ -1,7 +1,7 @@
 import edge
 from edge import Edge
 import networkx as nx
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 
 def get_incident_edges(G: nx.MultiGraph, u: int) -> List[Edge]:
@@ -60,23 +60,47 @@ def parallel_edges_between_u_and_v(G: nx.MultiGraph, u: int, v: int) -> List[Edg
 
     :param G: Input graph
     :type G: MultiGraph
-    :param n: Input node
     :param u: First node
     :type u: int
     :param v: Second node
     :type v: int
-    :return: List of all edges between the two nodes
+    :return: List of all edges between the two nodes (empty if there are none)
     :rtype: List[Edge]
     """
-    edges = []
-    k = 0
-    while G.has_edge(u, v, key=k):
-        edges.append(Edge(u, v, k, G.edges[u, v, k]['length']))
-        k += 1
-    return edges
+    if not G.has_edge(u, v):
+        return []
+    return [Edge(u, v, k, d['length']) for k, d in G[u][v].items()]
+
+
+ShortestEdgeIndex = Dict[Tuple[int, int], Tuple[int, float]]
+
+
+def _pair(u: int, v: int) -> Tuple[int, int]:
+    # the key of an unordered pair of nodes in a ShortestEdgeIndex
+    return (u, v) if u <= v else (v, u)
+
+
+def shortest_edge_index(G: nx.MultiGraph) -> ShortestEdgeIndex:
+    """Build an index of the shortest edge between each pair of adjacent nodes,
+    for use with ``get_edges_from_path`` and ``get_edges_from_paths``.
+
+    :param G: Input graph
+    :type G: MultiGraph
+    :return: Dictionary that maps each unordered pair of nodes (smallest node first)
+        to the key and length of the shortest edge between them
+    :rtype: Dict[Tuple[int, int], Tuple[int, float]]
+    """
+    index: ShortestEdgeIndex = {}
+    for u, v, k, length in G.edges(keys=True, data='length'):
+        pair = _pair(u, v)
+        # strictly shorter, so that of equally short edges the first one is kept
+        if pair not in index or length < index[pair][1]:
+            index[pair] = (k, length)
+    return index
 
 
-def get_edges_from_path(G: nx.MultiGraph, path: List[int]) -> List[Edge]:
+def get_edges_from_path(G: nx.MultiGraph, path: List[int],
+                        index: Optional[ShortestEdgeIndex] = None) -> List[Edge]:
     """Translates a path given as a list of nodes into a list of edges.
     If there are parallel edges, always use the shortest edge available.
 
@@ -84,9 +108,14 @@ def get_edges_from_path(G: nx.MultiGraph, path: List[int]) -> List[Edge]:
     :type G: MultiGraph
     :param path: Path given as a list of nodes.
     :type path: List[int]
+    :param index: If given, an index built by ``shortest_edge_index``,
+        so that each edge is a single lookup
+    :type index: Dict[Tuple[int, int], Tuple[int, float]], optional
     :return: List of edges corresponding to the shortest path visiting the same nodes in order.
     :rtype: List[Edge]
     """
+    if index is not None:
+        return [Edge(u, v, *index[_pair(u, v)]) for u, v in zip(path[:-1], path[1:])]
 
     path_edges = []
     for i in range(len(path) - 1):
@@ -96,6 +125,35 @@ def get_edges_from_path(G: nx.MultiGraph, path: List[int]) -> List[Edge]:
         if len(edges) == 1:
             path_edges += edges
         else:
-            path_edges += edge.shortest_edge(edges)
+            path_edges.append(edge.shortest_edge(edges))
 
     return path_edges
+
+
+def get_edges_from_paths(G: nx.MultiGraph, paths: List[List[int]],
+                         index: Optional[ShortestEdgeIndex] = None) -> List[List[Edge]]:
+    """Translates many paths, each given as a list of nodes, into lists of edges.
+    If there are parallel edges, always use the shortest edge available.
+    Same as calling ``get_edges_from_path`` on each path, but the shortest edge between
+    each pair of nodes is only looked up once, however many times the paths use it.
+
+    :param G: Input graph
+    :type G: MultiGraph
+    :param paths: Paths, each given as a list of nodes.
+    :type paths: List[List[int]]
+    :param index: If given, an index built by ``shortest_edge_index`` to look the edges up in
+    :type index: Dict[Tuple[int, int], Tuple[int, float]], optional
+    :return: List of edges for each path
+    :rtype: List[List[Edge]]
+    """
+    if index is None:
+        # index of only the pairs of nodes in the paths
+        index = {}
+        for path in paths:
+            for u, v in zip(path[:-1], path[1:]):
+                pair = _pair(u, v)
+                if pair not in index:
+                    index[pair] = min(((k, d['length']) for k, d in G[u][v].items()),
+                                      key=lambda kd: kd[1])
+
+    return [get_edges_from_path(G, path, index) for path in paths]
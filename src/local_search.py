@@ -0,0 +1,252 @@
+import bisect
+from collections import Counter
+from route import CompactRoute, Route
+from route_finder import RouteFinder
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+
+def improve_route(rf: RouteFinder, route: Route, window: int = 8,
+                  max_rounds: Optional[int] = None) -> Route:
+    """Improve a route (e.g. one found by ``greedy_nearest``) by local search, so that it visits
+    more new (unvisited) nodes, or the same number of new nodes with a shorter distance,
+    while staying within the finder's maximum distance. Rounds of the following moves are made
+    until none of them improves the route any more:
+
+    * removing retraced legs: a part of the route that comes back to the node it started from,
+      without visiting any new node that the rest of the route does not visit
+    * segment replacement: replacing a part of the route with at most ``window`` edges by the
+      shortest path between its ends, if that is shorter and loses no more new nodes than it gains
+    * detour insertion: inserting a trip out to a node and back at some point of the route,
+      using up the distance that is left, if it visits new nodes
+
+    Every move is evaluated from how many times the route visits each node, looking only at
+    the part of the route that changes. The distance table of ``rf`` rules out, without a search,
+    the parts of the route that cannot be shortened and the points of the route that have no new
+    node close enough for a detour. New nodes are the ones that are unvisited in ``rf``,
+    so the route should not already be marked as visited (``greedy_nearest`` marks it; use a
+    finder with the visited nodes from before the route was found).
+
+    :param rf: Finder the route was found with
+    :type rf: RouteFinder
+    :param route: Route from the source back to the source, no longer than ``rf.max_distance``
+    :type route: Route
+    :param window: Largest number of edges in a replaced segment
+    :type window: int
+    :param max_rounds: If given, stop after this many rounds of moves
+    :type max_rounds: int, optional
+    :return: The improved route (the input route is not modified)
+    :rtype: Route
+    """
+    search = _LocalSearch(rf, route)
+    rounds = 0
+    while max_rounds is None or rounds < max_rounds:
+        rounds += 1
+        improved = search.remove_retraced_legs()
+        improved |= search.replace_segments(window)
+        improved |= search.insert_detours()
+        if not improved:
+            break
+    return search.to_route()
+
+
+class _LocalSearch():
+    """A route being improved by ``improve_route``, as node indices and slots of ``rf.csr``,
+    together with the number of times it visits each node.
+    """
+    def __init__(self, rf: RouteFinder, route: Route) -> None:
+        self.csr = rf.csr
+        self.max_distance = rf.max_distance
+        self.visited = rf.visited
+        self.distance_from_source = rf.get_distance_from_source()
+
+        compact = CompactRoute.from_route(route, self.csr)
+        self.nodes: List[int] = compact.nodes.tolist()
+        self.slots: List[int] = compact.slots.tolist()
+        self.lengths: List[float] = self.csr.lengths[self.slots].tolist()  # length of each edge
+        self.distance: float = compact.distance
+        self.counts: Counter = Counter(self.nodes)
+
+        # sorted distances from the source of the new nodes that could join the route
+        unvisited = np.frombuffer(bytes(self.visited), dtype=np.uint8) == 0
+        candidates = np.isfinite(self.distance_from_source) & unvisited
+        candidates[self.nodes] = False
+        self.candidate_distances: List[float] = np.sort(
+            self.distance_from_source[candidates]).tolist()
+
+    def to_route(self) -> Route:
+        compact = CompactRoute(self.nodes[0])
+        for s, v, length in zip(self.slots, self.nodes[1:], self.lengths):
+            compact.add_edge(s, v, length)
+        return compact.to_route(self.csr)
+
+    def _is_new(self, n: int) -> bool:
+        return not self.visited[n]
+
+    def _lost(self, a: int, b: int) -> Tuple[int, Counter]:
+        # number of new nodes that would leave the route
+        # if the nodes between positions a and b were removed
+        removed = Counter(self.nodes[a + 1:b])
+        lost = sum(1 for n, c in removed.items() if c == self.counts[n] and self._is_new(n))
+        return lost, removed
+
+    def _gained(self, added: List[int], removed: Counter) -> int:
+        # number of new nodes that would join the route if the added nodes replaced the removed ones
+        return len({n for n in added if self._is_new(n) and self.counts[n] == removed[n]})
+
+    def _recount(self, removed: List[int], added: List[int]) -> None:
+        # update the number of visits of the nodes that leave and join the route,
+        # and which new nodes are not on it
+        for n in removed:
+            self.counts[n] -= 1
+            if self.counts[n] == 0 and self._is_new(n):
+                bisect.insort(self.candidate_distances, float(self.distance_from_source[n]))
+        for n in added:
+            if self.counts[n] == 0 and self._is_new(n):
+                self.candidate_distances.remove(float(self.distance_from_source[n]))
+            self.counts[n] += 1
+
+    def _replace(self, a: int, b: int, path: List[int]) -> None:
+        # replace the part of the route from position a to position b by a path with the same ends
+        # (the node at position a is kept, and every other node of the part is replaced);
+        # only the nodes and edges of the part and the path are looked at
+        self._recount(self.nodes[a + 1:b + 1], path[1:])
+        slots = self.csr.shortest_slots(np.array(path[:-1]), np.array(path[1:])).tolist()
+        lengths = self.csr.lengths[slots].tolist()
+        self.distance += sum(lengths) - sum(self.lengths[a:b])
+        self.nodes[a:b + 1] = path
+        self.slots[a:b] = slots
+        self.lengths[a:b] = lengths
+
+    def _shortest_paths(self, a: int, cutoff: float) -> Tuple[Dict[int, float], Dict[int, int]]:
+        # distances from the node at position a (out to the cutoff),
+        # and the node each one is reached from
+        distance: Dict[int, float] = {}
+        pred: Dict[int, int] = {}
+        for i, d in self.csr.iter_dijkstra(self.nodes[a], cutoff=cutoff, pred=pred):
+            distance[i] = d
+        # the node that owns each slot
+        owners = np.searchsorted(self.csr.offsets, np.fromiter(pred.values(), dtype=np.int64),
+                                 side='right') - 1
+        return distance, dict(zip(pred.keys(), owners.tolist()))
+
+    @staticmethod
+    def _path(parent: Dict[int, int], source: int, target: int) -> List[int]:
+        path = [target]
+        while path[-1] != source:
+            path.append(parent[path[-1]])
+        path.reverse()
+        return path
+
+    def _path_from_pred(self, pred: Dict[int, int], source: int, target: int) -> List[int]:
+        # path from source to target, following the slots recorded by iter_dijkstra
+        path = [target]
+        while path[-1] != source:
+            path.append(int(np.searchsorted(self.csr.offsets, pred[path[-1]], side='right')) - 1)
+        path.reverse()
+        return path
+
+    def remove_retraced_legs(self) -> bool:
+        # Removing a leg only takes away nodes, so a leg that was kept cannot be removed later
+        # either: after a removal, the scan goes on from where the leg was.
+        improved = False
+        positions: Dict[int, List[int]] = {}  # positions of each node so far, in order
+        b = 0
+        while b < len(self.nodes):
+            n = self.nodes[b]
+            seen = positions.setdefault(n, [])
+            a = seen[-1] if seen else None
+            seen.append(b)
+            # (removing everything between the start and the end is not a route)
+            if a is not None and not (a == 0 and b == len(self.nodes) - 1):
+                lost, _ = self._lost(a, b)
+                if lost == 0 and sum(self.lengths[a:b]) > 0:
+                    for m in self.nodes[a + 1:b + 1]:
+                        positions[m].pop()
+                    self._replace(a, b, [n])
+                    improved = True
+                    b = a
+            b += 1
+        return improved
+
+    def replace_segments(self, window: int) -> bool:
+        improved = False
+        a = 0
+        while a < len(self.nodes) - 2:
+            if self._replace_segment(a, window):
+                improved = True
+            else:
+                a += 1
+        return improved
+
+    def _replace_segment(self, a: int, window: int) -> bool:
+        # Replace a part of the route from position a by a shorter path, if there is one.
+        # The distance between two nodes is at least the difference of their distances from the
+        # source, so the parts that cannot be shortened are ruled out without a search.
+        u = self.nodes[a]
+        d_u = self.distance_from_source[u]
+        targets = []  # (position, length of the route from a to there)
+        length = 0.0
+        for b in range(a + 1, min(a + window, len(self.nodes) - 1) + 1):
+            length += self.lengths[b - 1]
+            t = self.nodes[b]
+            if b == a + 1 or (a == 0 and b == len(self.nodes) - 1 and t == u):
+                continue  # (replacing the whole route by its source is not a route)
+            if abs(self.distance_from_source[t] - d_u) < length - 1e-9:
+                targets.append((b, length))
+        if not targets:
+            return False
+
+        # nodes are only settled as far as the next part needs
+        distance: Dict[int, float] = {}
+        pred: Dict[int, int] = {}
+        settled = self.csr.iter_dijkstra(u, cutoff=targets[-1][1], pred=pred)
+        d = 0.0
+        for b, length in targets:
+            t = self.nodes[b]
+            while t not in distance and d < length - 1e-9:
+                i, d = next(settled, (t, np.inf))  # (t is not reached at all)
+                distance[i] = d
+            if distance.get(t, np.inf) >= length - 1e-9:
+                continue
+            path = self._path_from_pred(pred, u, t)
+            lost, removed = self._lost(a, b)
+            if self._gained(path[1:-1], removed) >= lost:
+                self._replace(a, b, path)
+                return True
+        return False
+
+    def _candidates_within(self, u: int, radius: float) -> bool:
+        # whether a new node that is not on the route could be within a distance of a node,
+        # going by the difference of their distances from the source
+        d_u = self.distance_from_source[u]
+        k = bisect.bisect_left(self.candidate_distances, d_u - radius - 1e-9)
+        return (k < len(self.candidate_distances)
+                and self.candidate_distances[k] <= d_u + radius + 1e-9)
+
+    def insert_detours(self) -> bool:
+        improved = False
+        for a in range(len(self.nodes)):
+            slack = self.max_distance - self.distance
+            if slack <= 0:
+                break
+            u = self.nodes[a]
+            if not self._candidates_within(u, slack / 2):
+                continue
+
+            # number of new nodes on the shortest path to each node within half of the distance left
+            distance, parent = self._shortest_paths(a, slack / 2)
+            gain = {u: 0}
+            best, best_gain = None, 0
+            for v in distance:  # (in the order the nodes were settled, so parents come first)
+                if v == u:
+                    continue
+                gain[v] = gain[parent[v]] + (1 if self._is_new(v) and self.counts[v] == 0 else 0)
+                if gain[v] > best_gain:
+                    best, best_gain = v, gain[v]
+
+            if best is not None:
+                path = self._path(parent, u, best)
+                self._replace(a, a, path + path[-2::-1])
+                improved = True
+        return improved
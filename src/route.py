@@ -1,5 +1,10 @@
-from typing import List
+from array import array
+from typing import List, Optional, TYPE_CHECKING
 from edge import Edge
+import numpy as np
+
+if TYPE_CHECKING:
+    from csr_graph import CSRGraph
 
 
 class Route():
@@ -21,6 +26,19 @@ class Route():
     def __str__(self):
         return str(self.nodes)
 
+    def copy(self) -> "Route":
+        """Return a copy of the route. The copy has its own lists of nodes and edges,
+        which hold the same (immutable) node ids and ``Edge`` objects as this route.
+
+        :return: A copy of the route
+        :rtype: Route
+        """
+        r = Route()
+        r.nodes = self.nodes.copy()
+        r.edges = self.edges.copy()
+        r.distance = self.distance
+        return r
+
     def add_edge(self, e: Edge):
         """Add an edge to the end of the route.
 
@@ -37,3 +55,113 @@ class Route():
         self.nodes.pop()
         e = self.edges.pop()
         self.distance -= e.length
+
+
+class CompactRoute():
+    """Compact route representation backed by typed arrays, used while searching for routes.
+    Nodes are identified by their node index in a ``CSRGraph``, and edges by their slot in it.
+    Copying a route copies three flat arrays, without creating any Python objects per node or edge.
+
+    :ivar nodes: Node indices of the nodes visited
+    :ivar slots: Slots of the edges traversed
+    :ivar distances: Cumulative distance at each node (starting with 0 at the first node)
+    """
+    __slots__ = ('nodes', 'slots', 'distances')
+
+    def __init__(self, source: Optional[int] = None) -> None:
+        """Initialize a route with no edges, that starts at the given node index
+        (or an empty route, if no node is given).
+
+        :param source: Node index of the starting node
+        :type source: int, optional
+        """
+        self.nodes = array('q')
+        self.slots = array('q')
+        self.distances = array('d')
+        if source is not None:
+            self.nodes.append(source)
+            self.distances.append(0.0)
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    @property
+    def distance(self) -> float:
+        """The total distance of the route.
+        """
+        return self.distances[-1] if self.distances else 0.0
+
+    def add_edge(self, s: int, v: int, length: float) -> None:
+        """Add an edge to the end of the route.
+
+        :param s: Slot of the edge
+        :type s: int
+        :param v: Node index at the end of the edge
+        :type v: int
+        :param length: Length of the edge
+        :type length: float
+        """
+        self.nodes.append(v)
+        self.slots.append(s)
+        self.distances.append(self.distances[-1] + length)
+
+    def pop_edge(self) -> None:
+        """Remove the last edge from the route.
+        """
+        self.nodes.pop()
+        self.slots.pop()
+        self.distances.pop()
+
+    def copy(self) -> "CompactRoute":
+        """Return a copy of the route.
+
+        :return: A copy of the route
+        :rtype: CompactRoute
+        """
+        r = CompactRoute()
+        r.nodes = self.nodes[:]
+        r.slots = self.slots[:]
+        r.distances = self.distances[:]
+        return r
+
+    def to_route(self, csr: "CSRGraph") -> Route:
+        """Convert to a ``Route`` with original node ids and ``Edge`` objects.
+
+        :param csr: The graph the route was found in
+        :type csr: CSRGraph
+        :return: The same route as a ``Route``
+        :rtype: Route
+        """
+        nodes = csr.node_ids[np.frombuffer(self.nodes, dtype=np.int64)].tolist()
+        slots = np.frombuffer(self.slots, dtype=np.int64)
+
+        r = Route()
+        r.nodes = nodes
+        keys = csr.keys[slots].tolist()
+        lengths = csr.lengths[slots].tolist()
+        r.edges = [Edge(u, v, k, length)
+                   for u, v, k, length in zip(nodes[:-1], nodes[1:], keys, lengths)]
+        r.distance = self.distance
+        return r
+
+    @classmethod
+    def from_route(cls, route: Route, csr: "CSRGraph") -> "CompactRoute":
+        """Convert a ``Route`` to a compact route.
+
+        :param route: Input route
+        :type route: Route
+        :param csr: The graph the route is in
+        :type csr: CSRGraph
+        :return: The same route as a ``CompactRoute``
+        :rtype: CompactRoute
+        :raises KeyError: If one of the edges of the route is not in the graph
+        """
+        r = cls(csr.index[route.nodes[0]])
+        for e in route.edges:
+            i, j = csr.index[e.u], csr.index[e.v]
+            s = next((s for s in csr.slots(i) if csr.neighbors[s] == j and csr.keys[s] == e.key),
+                     None)
+            if s is None:
+                raise KeyError((e.u, e.v, e.key))
+            r.add_edge(s, j, e.length)
+        return r
@@ -0,0 +1,153 @@
+from collections import OrderedDict
+import hashlib
+import os
+import pickle
+from route import Route
+from route_finder import RouteFinder
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class RouteCache():
+    """Cache of the results of route searches, so that repeated requests do not search again.
+
+    A result is identified by the graph (by a fingerprint of its arrays,
+    see ``CSRGraph.fingerprint``), the source, the maximum distance, the search and its options,
+    and a hash of which nodes are visited.
+    So a result is never reused for a graph that changed or for a different visited state.
+    The most recently used results are kept in memory, and optionally every result is also saved
+    in a directory, which can be shared by many processes and outlives them.
+
+    :ivar max_entries: Largest number of results kept in memory
+        (the least recently used are evicted first)
+    :ivar path: Directory where results are saved, or None to only keep them in memory
+    :ivar hits: Number of requests answered from the cache
+    :ivar misses: Number of requests that needed a search
+    """
+    def __init__(self, max_entries: int = 1024, path: Optional[str] = None) -> None:
+        """Create an empty cache.
+
+        :param max_entries: Largest number of results kept in memory
+        :type max_entries: int
+        :param path: If given, directory to also save every result in (created if it does not exist)
+        :type path: str, optional
+        """
+        self.max_entries = max_entries
+        self.path = path
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """Remove every result kept in memory (results saved in the directory are kept).
+        """
+        self._entries.clear()
+
+    def key(self, rf: RouteFinder, algorithm: str) -> str:
+        """Return the key of a search by a finder in its current state.
+
+        :param rf: Finder
+        :type rf: RouteFinder
+        :param algorithm: Name of the search, including any options that change its result
+        :type algorithm: str
+        :return: Key (a hexadecimal string)
+        :rtype: str
+        """
+        h = hashlib.blake2b(digest_size=20)
+        h.update(rf.csr.fingerprint().encode())
+        h.update(repr((rf.source, float(rf.max_distance), algorithm)).encode())
+        h.update(rf.visited)
+        return h.hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key + '.pickle')
+
+    def _get(self, key: str) -> Optional[Any]:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        if self.path is not None and os.path.exists(self._file(key)):
+            with open(self._file(key), 'rb') as f:
+                value = pickle.load(f)
+            self._put(key, value, save=False)
+            return value
+        return None
+
+    def _put(self, key: str, value: Any, save: bool = True) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if save and self.path is not None:
+            # written to a temporary file first, so that other processes never read half a file
+            tmp_file = self._file(key) + f'.{os.getpid()}.tmp'
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, self._file(key))
+
+    def get_or_search(self, rf: RouteFinder, algorithm: str, search: Callable[[], Any]) -> Any:
+        """Return the cached result of a search, or run the search and cache its result.
+        The result is returned as stored, so it must not be modified.
+
+        :param rf: Finder that would run the search
+        :type rf: RouteFinder
+        :param algorithm: Name of the search, including any options that change its result
+        :type algorithm: str
+        :param search: Runs the search and returns its result (which must be picklable, if saved)
+        :type search: Callable[[], Any]
+        :return: The result of the search
+        :rtype: Any
+        """
+        # (the key is made before searching, since a search may mark nodes as visited)
+        key = self.key(rf, algorithm)
+        value = self._get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = search()
+        self._put(key, value)
+        return value
+
+    def greedy_nearest(self, rf: RouteFinder) -> Route:
+        """Same as ``rf.greedy_nearest()``, using the cache. As without the cache,
+        the nodes of the route are marked as visited in ``rf``.
+
+        :param rf: Finder
+        :type rf: RouteFinder
+        :return: Route found using a greedy algorithm
+        :rtype: Route
+        """
+        route = self.get_or_search(rf, 'greedy_nearest', rf.greedy_nearest)
+        for n in route.nodes:
+            rf.mark_as_visited(n)
+        return route.copy()
+
+    def brute_force(self, rf: RouteFinder, dedup: bool = False) -> List[Route]:
+        """Same as ``rf.brute_force(dedup=dedup)``, using the cache.
+
+        :param rf: Finder
+        :type rf: RouteFinder
+        :param dedup: If True, return only the first of the routes that traverse the same edges
+        :type dedup: bool
+        :return: List of all possible routes
+        :rtype: List[Route]
+        """
+        routes = self.get_or_search(rf, f'brute_force(dedup={dedup})',
+                                    lambda: rf.brute_force(dedup=dedup))
+        return [r.copy() for r in routes]
+
+    def best_route(self, rf: RouteFinder) -> Tuple[Route, int]:
+        """Same as ``rf.best_route()``, using the cache.
+
+        :param rf: Finder
+        :type rf: RouteFinder
+        :return: The best route, and its number of new nodes
+        :rtype: Tuple[Route, int]
+        """
+        route, new_nodes = self.get_or_search(rf, 'best_route', rf.best_route)
+        return route.copy(), new_nodes
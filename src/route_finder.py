@@ -1,30 +1,352 @@
-import copy
+import csr_graph
+from csr_graph import CSRGraph
 from edge import Edge
 import edge
-from route import Route
+from route import CompactRoute, Route
+from search_stats import SearchStats
+from tile_index import TileIndex
+from visited_store import VisitedStore
 import networkx as nx
-from typing import List
-import graph_utils
+import numpy as np
+import bisect
+from collections import OrderedDict
+import contextlib
+import functools
+import itertools
+import multiprocessing
+import multiprocessing.pool
+import time
+from typing import (Callable, ContextManager, Dict, Iterable, Iterator, List, NamedTuple, Optional,
+                    Tuple, Union)
+
+
+class SearchResult(NamedTuple):
+    """The route returned by ``RouteFinder.anytime_route``.
+    """
+    route: Route
+    new_nodes: int  # number of new (unvisited) nodes in the route
+    complete: bool  # True if the search finished, so that no route has more new nodes
+
+
+class SweepResult(NamedTuple):
+    """The routes found by ``RouteFinder.sweep`` for one maximum distance.
+    """
+    max_distance: float
+    route: Route  # route found by greedy_nearest
+    new_nodes: int  # number of new (unvisited) nodes in the route
+    best_route: Optional[Route] = None  # route with the most new nodes, if asked for
+    best_new_nodes: Optional[int] = None
 
 
 class RouteFinder():
-    def __init__(self, G: nx.MultiGraph, source: int, max_distance: float):
+    def __init__(self, G: Union[nx.MultiGraph, CSRGraph, TileIndex], source: int,
+                 max_distance: float,
+                 distance_from_source: Optional[np.ndarray] = None,
+                 visited: Optional[Union[Iterable[int], VisitedStore]] = None,
+                 stats: Optional[SearchStats] = None,
+                 tracer: Optional[Callable[[str, SearchStats], None]] = None,
+                 cache_size: Optional[int] = 65536,
+                 prune: bool = False):
         """Create an instance of RouteFinder, which is uniquely identified
         by a graph, a source node (which must also be the ending node),
         and a maximum allowed total distance for a generated route.
 
-        :param G: Input graph
-        :type G: MultiGraph
+        The graph is not copied or modified, so many finders can share one loaded graph.
+        Each finder keeps track of which nodes are visited on its own.
+
+        :param G: Input graph, either as a ``MultiGraph`` (which must not be modified afterwards),
+            as an already built ``CSRGraph``, or as a ``TileIndex`` over a large graph
+            (in which case only the tiles around the source are read,
+            and the graph is always pruned)
+        :type G: MultiGraph, CSRGraph or TileIndex
         :param source: Starting node (which will also be the ending node)
         :type source: int
         :param max_distance: Maximum distance for the route
         :type max_distance: float
+        :param distance_from_source: Optional precomputed distance table, as returned by
+            ``get_distance_from_source`` of another finder with the same graph and source and a
+            maximum distance at least as large as this one.
+            If not given, it is computed on first use.
+            The table of a pruned finder is indexed by its subgraph, so it can only be used
+            together with that finder's ``csr`` as the graph.
+        :type distance_from_source: ndarray, optional
+        :param visited: Nodes that have already been visited (all other nodes start out unvisited),
+            either as an iterable of nodes or as a ``VisitedStore`` holding a longer history
+        :type visited: Iterable[int] or VisitedStore, optional
+        :param stats: If given, the finder counts and times its work in it
+            (work done in worker processes is not included)
+        :type stats: SearchStats, optional
+        :param tracer: If given, called with the name of the search and the statistics
+            at the end of every ``greedy_nearest``, ``iter_routes`` (and ``brute_force``)
+            and ``best_route``.
+            A ``SearchStats`` is created for it if ``stats`` is not given.
+        :type tracer: Callable[[str, SearchStats], None], optional
+        :param cache_size: Maximum number of nodes whose incident edges are kept in the cache
+            used by ``get_viable_edges`` (the least recently used are evicted first),
+            or None for no limit
+        :type cache_size: int, optional
+        :param prune: If True, the finder works on a subgraph of only the nodes no farther than
+            half of the maximum distance from the source (see ``CSRGraph.ball``), which are the only
+            nodes a route can go through, so that the cost of each step depends on the maximum
+            distance rather than on the size of the graph. The routes found are the same, but nodes
+            outside the subgraph are not in ``self.csr`` (and ``get_incident_edges`` leaves out
+            edges to them).
+            A ``distance_from_source`` table, if given, must still be indexed like the input graph.
+        :type prune: bool
+        :raises ValueError: If ``distance_from_source`` does not have one entry per node
+            of the graph
         """
-        self.G = copy.deepcopy(G)
+        self.G = G
         self.source: int = source
         self.max_distance: float = max_distance
 
-        self.distance_from_source = None
+        # the searches run on a compact array-backed copy of the graph,
+        # where nodes are identified by a dense index instead of their original id
+        if isinstance(G, TileIndex):
+            self.csr: CSRGraph = G.extract(source, max_distance / 2)
+            prune = True
+        else:
+            self.csr = G if isinstance(G, CSRGraph) else csr_graph.get_csr_graph(G)
+
+        n = self.csr.number_of_nodes()
+        if distance_from_source is not None and len(distance_from_source) != n:
+            raise ValueError(f'distance_from_source has {len(distance_from_source)} entries, '
+                             f'but the graph has {n} nodes '
+                             '(the table of a pruned finder only fits its csr)')
+
+        if prune:
+            if distance_from_source is None:
+                self.csr, distance_from_source = self.csr.ball(self.csr.index[source],
+                                                               max_distance / 2)
+            else:
+                nodes = np.flatnonzero(np.isfinite(distance_from_source))
+                self.csr = self.csr.subgraph(nodes)
+                distance_from_source = distance_from_source[nodes]
+        self._source_index: int = self.csr.index[source]
+        self._pruned: bool = prune
+
+        # one byte per node index, nonzero if the node has been visited
+        if isinstance(visited, VisitedStore):
+            self.visited = bytearray(visited.mask(self.csr).astype(np.uint8))
+        else:
+            self.visited = bytearray(self.csr.number_of_nodes())
+            if visited is not None:
+                self.mark_nodes_as_visited(visited)
+
+        self.distance_from_source: Optional[np.ndarray] = distance_from_source
+
+        # for each node index: its incident edges, and the distance of going along each edge
+        # and then back to the source, in least recently used order
+        self.cache_size: Optional[int] = cache_size
+        self._incident_cache: "OrderedDict[int, _Incident]" = OrderedDict()
+
+        # whether the graph, the distance table and the cache are copies this finder made
+        # when edges changed, which later changes can update in place
+        self._owns_copies = False
+
+        if tracer is not None and stats is None:
+            stats = SearchStats()
+        self.stats: Optional[SearchStats] = stats
+        self.tracer: Optional[Callable[[str, SearchStats], None]] = tracer
+
+    def _phase(self, name: str) -> ContextManager:
+        # times a phase of the search, if statistics are being kept
+        return contextlib.nullcontext() if self.stats is None else self.stats.phase(name)
+
+    def _counters(self) -> SearchStats:
+        # where a search counts its work: a throwaway instance if no statistics are being kept,
+        # so that the search loops do not have to check
+        return self.stats if self.stats is not None else SearchStats()
+
+    def _trace(self, name: str) -> None:
+        if self.tracer is not None:
+            self.tracer(name, self.stats)
+
+    def is_unvisited(self, u: int) -> bool:
+        """Returns True if the input node is unvisited, and false otherwise.
+
+        :param u: Input node
+        :type u: int
+        :return: True if node is unvisited, and false otherwise
+        :rtype: bool
+        """
+        return not self.visited[self.csr.index[u]]
+
+    def mark_as_visited(self, n: int) -> None:
+        """Marks the input node as visited.
+
+        :param n: Input node
+        :type n: int
+        """
+        self.visited[self.csr.index[n]] = 1
+
+    def _node_indices(self, nodes: Iterable[int]) -> np.ndarray:
+        # node indices of some nodes; nodes outside the subgraph of a pruned finder are left out
+        index = self.csr.index
+        if self._pruned:
+            nodes = (n for n in nodes if n in index)
+        return np.fromiter((index[n] for n in nodes), dtype=np.int64)
+
+    def mark_nodes_as_visited(self, nodes: Iterable[int]) -> None:
+        """Marks many nodes as visited at once (e.g. all the nodes of a completed route).
+        For a pruned finder, nodes outside its subgraph are ignored.
+
+        :param nodes: Input nodes
+        :type nodes: Iterable[int]
+        """
+        np.frombuffer(self.visited, dtype=np.uint8)[self._node_indices(nodes)] = 1
+
+    def mark_nodes_as_unvisited(self, nodes: Iterable[int]) -> None:
+        """Marks many nodes as unvisited at once (e.g. to undo ``mark_nodes_as_visited``).
+        For a pruned finder, nodes outside its subgraph are ignored.
+
+        :param nodes: Input nodes
+        :type nodes: Iterable[int]
+        """
+        np.frombuffer(self.visited, dtype=np.uint8)[self._node_indices(nodes)] = 0
+
+    def set_edge_lengths(self, lengths: Dict[Tuple[int, int, int], float]) -> None:
+        """Change the lengths of some edges (e.g. to avoid a street without closing it).
+        See ``remove_edges``.
+
+        :param lengths: New length of each edge, keyed by (u, v, key)
+        :type lengths: Dict[Tuple[int, int, int], float]
+        :raises KeyError: If one of the edges is not in the graph
+        """
+        self._update_edges(lengths)
+
+    def remove_edges(self, edges: Iterable[Tuple[int, int, int]]) -> None:
+        """Remove some edges (e.g. closed streets) from the graph the finder searches.
+
+        The input graph is not modified: the finder switches to a changed copy of it
+        (see ``CSRGraph.with_edge_changes``), so other finders sharing the graph are not affected.
+        The distance table, if it was computed already, is repaired rather than computed again
+        (see ``CSRGraph.repair_distances``), so only the part of the graph around the changed edges
+        is searched, and only the cached incident edges of the nodes around them are dropped.
+        The copies are the finder's own, so later changes of lengths are made to them in place
+        (copy ``self.csr`` or the distance table to keep them as they were).
+        For a pruned finder, edges with an end outside its subgraph are ignored, and nodes outside
+        of it are never added, even if shorter edges bring them within half of the maximum distance.
+
+        :param edges: Edges to remove, as (u, v, key)
+        :type edges: Iterable[Tuple[int, int, int]]
+        :raises KeyError: If one of the edges is not in the graph
+        """
+        self._update_edges({e: None for e in edges})
+
+    def _update_edges(self, changes: Dict[Tuple[int, int, int], Optional[float]]) -> None:
+        # new length of some edges (or None to remove them); applied to a copy of the graph
+        # (or to the finder's own copy in place), then the distance table and the cache of incident
+        # edges are brought up to date
+        csr = self.csr
+        index = csr.index
+        lengths: Dict[int, float] = {}
+        removed: List[int] = []
+        pairs = set()
+        for (u, v, k), length in changes.items():
+            if self._pruned and (u not in index or v not in index):
+                continue
+            i, j = index[u], index[v]
+            slots = csr.edge_slots(i, j, k)
+            if length is None:
+                removed.extend(slots)
+            else:
+                lengths.update((s, length) for s in slots)
+            pairs.add((i, j))
+        if not pairs:
+            return
+        old_lengths = [(i, j, csr.edge_length(i, j)) for i, j in pairs]
+        # (the graph, the table and the cache are copied the first time, since they may be shared
+        # with other finders)
+        own = self._owns_copies
+        self.csr = csr = csr.with_edge_changes(lengths, removed, copy=not own)
+
+        stale = {i for pair in pairs for i in pair}
+        if self.distance_from_source is not None:
+            distance = self.distance_from_source if own else self.distance_from_source.copy()
+            with self._phase('distance_from_source'):
+                repaired = csr.repair_distances(distance, self._source_index, old_lengths,
+                                                cutoff=self.max_distance / 2)
+            self.distance_from_source = distance
+            if self.stats is not None:
+                self.stats.shortest_path_queries += 1
+                self.stats.nodes_settled += len(repaired)
+            # the cached distances back to the source go through the neighbors of each node
+            for i in repaired:
+                stale.update(csr.neighbors[csr.offsets[i]:csr.offsets[i + 1]].tolist())
+
+        self._drop_incident(stale, everything=bool(removed), copy=not own)
+        self._owns_copies = True
+
+    def _drop_incident(self, stale: Iterable[int], everything: bool, copy: bool) -> None:
+        # drop the cached incident edges of some nodes, from a copy of the cache if it may be shared
+        # with other finders (removing edges moves the slots of the edges after them,
+        # so then nothing cached can be kept)
+        if everything:
+            self._incident_cache = OrderedDict()
+        elif copy:
+            self._incident_cache = OrderedDict(
+                (i, cached) for i, cached in self._incident_cache.items() if i not in stale)
+        else:
+            for i in stale:
+                self._incident_cache.pop(i, None)
+
+    def get_distance_from_source(self) -> np.ndarray:
+        """Return the distance of every node from the source, out to half of the maximum distance.
+        The table is computed with a single Dijkstra search the first time it is needed.
+
+        No node farther than half of the maximum distance can be part of a route,
+        since the route has to get there and back again. Because the graph is undirected,
+        the distance from the source to a node is also the distance from that node back
+        to the source.
+
+        :return: Array indexed by node index (see ``self.csr.index``), with the shortest distance
+            from the source as the value. Nodes farther than half of the maximum distance
+            are ``inf``.
+            For a pruned finder, it is indexed by the subgraph ``self.csr``, not the input graph.
+        :rtype: ndarray
+        """
+        if self.distance_from_source is None:
+            with self._phase('distance_from_source'):
+                self.distance_from_source = self.csr.single_source_dijkstra(
+                    self._source_index, cutoff=self.max_distance / 2)
+            if self.stats is not None:
+                self.stats.shortest_path_queries += 1
+                self.stats.nodes_settled += int(np.isfinite(self.distance_from_source).sum())
+        return self.distance_from_source
+
+    def _get_incident(self, i: int) -> "_Incident":
+        # cached incident edges of node index i, and their distances back to the source
+        cached = self._incident_cache.get(i)
+        if cached is not None:
+            self._incident_cache.move_to_end(i)
+            return cached
+
+        distance_from_source = self.get_distance_from_source()
+        csr = self.csr
+        lo, hi = csr.offsets[i], csr.offsets[i + 1]
+        edges = csr.incident_edges(int(csr.node_ids[i]))
+        # nodes too far away to get back from are at infinite distance,
+        # so they always fail the check
+        return_distance = (csr.lengths[lo:hi] + distance_from_source[csr.neighbors[lo:hi]]).tolist()
+
+        cached = _Incident(edges, return_distance, csr.neighbors[lo:hi].tolist(), int(lo))
+        self._incident_cache[i] = cached
+        if self.cache_size is not None and len(self._incident_cache) > self.cache_size:
+            self._incident_cache.popitem(last=False)
+        return cached
+
+    def get_incident_edges(self, u: int) -> List[Edge]:
+        """For an input node, get a list of all the incident edges
+        (all edges that start at the input node). Same as ``graph_utils.get_incident_edges``,
+        but the edges are cached by the finder.
+
+        :param u: Node
+        :type u: int
+        :return: List of edges that are incident on this node
+        :rtype: List[Edge]
+        """
+        return list(self._get_incident(self.csr.index[u]).edges)
 
     def get_viable_edges(self, route: Route) -> List[Edge]:
         """From the last node of the input route, get a list of incident edges
@@ -38,61 +360,416 @@ class RouteFinder():
             node
         :rtype: List[Edge]
         """
+        # the distance of going along each edge and then back to the source is cached per node,
+        # so each edge only needs one comparison
+        incident = self._get_incident(self.csr.index[route.nodes[-1]])
+        remaining = self.max_distance - route.distance
+        return [e for e, d in zip(incident.edges, incident.return_distance) if d <= remaining]
 
-        u = route.nodes[-1]
-        incident_edges = graph_utils.get_incident_edges(self.G, u)
+    def _get_viable_slots(self, route: CompactRoute) -> List[Tuple[int, int, float]]:
+        # Same as get_viable_edges, for a compact route:
+        # (slot, node index, length) of each viable edge
+        incident = self._get_incident(route.nodes[-1])
+        remaining = self.max_distance - route.distance
+        return [(incident.first_slot + k, incident.neighbors[k], incident.edges[k].length)
+                for k, d in enumerate(incident.return_distance) if d <= remaining]
 
-        viable = []
-        for e in incident_edges:
-            if (route.distance + e.length
-                + nx.shortest_path_length(self.G,
-                                          source=e.v,
-                                          target=self.source,
-                                          weight='length')) <= self.max_distance:
-                viable.append(e)
+    def _iter_routes(self, route: CompactRoute, deadline: Optional[float],
+                     seen: Optional[set] = None) -> Iterator[CompactRoute]:
+        # Depth first search with an explicit stack: stack[k] iterates over the viable edges
+        # from the last node of the route when it has k edges more than the starting route.
+        # If a set is given as seen, partial routes with the same edges (in any order) and the same
+        # last node as one already in it are skipped, since they have the same completions.
+        stats = self._counters()
+        if deadline is not None and time.perf_counter() > deadline:
+            return
+        expand = iter if seen is None else _SeenRoutes(seen, route, self.csr).unseen
+        viable_slots = self._get_viable_slots(route)
+        if not viable_slots:
+            stats.routes_emitted += 1
+            yield route.copy()
+            return
 
-        return viable
+        stack = [expand(viable_slots)]
+        while stack:
+            e = next(stack[-1], None)
+            if e is None:
+                stack.pop()
+                if stack:
+                    route.pop_edge()  # backtracking
+                    stats.backtracks += 1
+                continue
 
-    def _recursive_brute_force(self, route: Route, routes: List[Route]) -> None:
-        viable_edges = self.get_viable_edges(route)
-        if viable_edges:
-            for e in viable_edges:
-                route.add_edge(e)
-                self._recursive_brute_force(route, routes)
+            route.add_edge(*e)
+            stats.edges_expanded += 1
+            if deadline is not None and time.perf_counter() > deadline:
+                return
+            viable_slots = self._get_viable_slots(route)
+            if viable_slots:
+                stack.append(expand(viable_slots))
+            else:
+                stats.routes_emitted += 1
+                yield route.copy()
                 route.pop_edge()  # backtracking
-        else:
-            routes.append(copy.deepcopy(route))
+                stats.backtracks += 1
+
+    def iter_routes(self, max_routes: Optional[int] = None, time_limit: Optional[float] = None,
+                    compact: bool = False,
+                    dedup: bool = False) -> Iterator[Union[Route, CompactRoute]]:
+        """Same search as ``brute_force``, but routes are yielded one at a time as they are found,
+        so that they can be filtered or the search stopped early without keeping every route
+        in memory.
+
+        :param max_routes: Stop after this many routes have been yielded
+        :type max_routes: int, optional
+        :param time_limit: Stop once this many seconds have passed since the search started
+        :type time_limit: float, optional
+        :param compact: If True, yield ``CompactRoute`` objects (in terms of ``self.csr``),
+            which are much cheaper to create than ``Route`` objects
+        :type compact: bool
+        :param dedup: If True, skip routes that traverse the same edges as an earlier route
+            (see ``brute_force``)
+        :type dedup: bool
+        :return: Iterator of all possible routes, in the same order as ``brute_force``
+        :rtype: Iterator[Route] or Iterator[CompactRoute]
+        """
+        deadline = None if time_limit is None else time.perf_counter() + time_limit
+
+        routes = self._iter_routes(CompactRoute(self._source_index), deadline,
+                                   set() if dedup else None)
+        if max_routes is not None:
+            routes = itertools.islice(routes, max_routes)
+        if not compact:
+            routes = (r.to_route(self.csr) for r in routes)
+        # (the time of this phase includes the time spent by the caller between routes)
+        with self._phase('brute_force'):
+            yield from routes
+        self._trace('brute_force')
 
-    def brute_force(self) -> List[Route]:
+    def brute_force(self, processes: Optional[int] = None, split_depth: int = 1,
+                    dedup: bool = False) -> List[Route]:
         """Use an algorithm based on Depth First Search (DFS) to find all possible routes
         that start from (and end at) the route finder's starting node and has a
         total distance less than the route finder's maximum distance.
 
+        Many routes traverse the same edges in a different order, e.g. every route and its reverse.
+        With ``dedup``, each partial route is identified by a hash of its edges (as a multiset,
+        kept up to date as edges are added and removed) and its last node, and a partial route
+        that is equivalent to one already searched is skipped along with all its completions,
+        which all have an equivalent route among the completions of the earlier one.
+        Only the first of each set of equivalent routes is returned, at the cost of remembering
+        every partial route searched.
+
+        :param processes: If given, the search is split into independent subtrees (see ``split``)
+            that are explored by this many worker processes
+        :type processes: int, optional
+        :param split_depth: Number of edges at which the search is split,
+            when using worker processes
+        :type split_depth: int
+        :param dedup: If True, return only the first of the routes that traverse the same edges
+        :type dedup: bool
         :return: List of all possible routes
+            (in the same order whether or not worker processes are used)
         :rtype: List[Route]
         """
-        all_routes: List[Route] = []  # store all routes found through brute force
-
-        route = Route()
-        route.nodes.append(self.source)
-        self._recursive_brute_force(route, all_routes)
-
         # Important caveat: brute force here will always keep going as long
         # as it is possible without the distance being too large. So routes
         # that could end early (because they go back to the start node) are not
         # separately included.
 
+        if processes is None:
+            return list(self.iter_routes(dedup=dedup))
+
+        all_routes: List[Route] = []
+        seen = set()
+        edge_hashes = self.csr.edge_hashes().tolist()
+        search_subtree = functools.partial(_brute_force_subtree, dedup=dedup)
+        with self._pool(processes) as pool:
+            # subtrees are merged in order as soon as each one is finished
+            for routes in pool.imap(search_subtree, self.split(split_depth)):
+                if dedup:
+                    # each subtree is searched on its own,
+                    # so different subtrees can return equivalent routes
+                    keys = [_route_key(r, edge_hashes) for r in routes]
+                    routes = [r for r, key in zip(routes, keys) if key not in seen]
+                    seen.update(keys)
+                all_routes += [r.to_route(self.csr) for r in routes]
         return all_routes
 
-    # @staticmethod
-    # def count_unique_nodes(route: Route) -> int:
-    #    return len(set(route.nodes))
+    def split(self, depth: int) -> List[Route]:
+        """Split the search for routes into independent subtrees, one for each partial route
+        with ``depth`` edges. The routes that are already complete with fewer edges
+        are included as well.
+
+        :param depth: Number of edges in each partial route
+        :type depth: int
+        :return: Partial routes in the order the DFS would reach them
+        :rtype: List[Route]
+        """
+        route = Route()
+        route.nodes.append(self.source)
+
+        frontier = [route]
+        for _ in range(depth):
+            next_frontier = []
+            for r in frontier:
+                viable_edges = self.get_viable_edges(r)
+                if not viable_edges:
+                    next_frontier.append(r)  # already a complete route
+                for e in viable_edges:
+                    r_next = r.copy()
+                    r_next.add_edge(e)
+                    next_frontier.append(r_next)
+            frontier = next_frontier
+        return frontier
+
+    def _pool(self, processes: int) -> multiprocessing.pool.Pool:
+        # every worker process gets its own copy of this finder (inherited, where fork is available)
+        if 'fork' in multiprocessing.get_all_start_methods():
+            ctx = multiprocessing.get_context('fork')
+        else:
+            ctx = multiprocessing.get_context()
+        shared_best = ctx.Value('i', -1)
+        initargs = (self.csr, self.source, self.max_distance, self.get_distance_from_source(),
+                    self.visited, shared_best)
+        return ctx.Pool(processes, initializer=_init_worker, initargs=initargs)
+
+    def count_new_nodes(self, route: Route) -> int:
+        """Count the number of distinct unvisited nodes in a route.
 
-    # @staticmethod
-    # def maximize_new_nodes(routes: List[Route]) -> List[Route]:
-        # return routes that have the largest number of new nodes
-    #    max_new_nodes = max([__class__.count_unique_nodes(r) for r in routes])
-    #    return [r for r in routes if __class__.count_unique_nodes(r) == max_new_nodes]
+        :param route: Input route
+        :type route: Route
+        :return: Number of new nodes the route would visit
+        :rtype: int
+        """
+        return len([n for n in set(route.nodes) if self.is_unvisited(n)])
+
+    def maximize_new_nodes(self, routes: List[Route]) -> List[Route]:
+        """Return the routes that have the largest number of new nodes.
+
+        :param routes: List of routes, e.g. as found by ``brute_force``
+        :type routes: List[Route]
+        :return: The routes with the largest number of new nodes
+        :rtype: List[Route]
+        """
+        new_nodes = [self.count_new_nodes(r) for r in routes]
+        max_new_nodes = max(new_nodes)
+        return [r for r, n in zip(routes, new_nodes) if n == max_new_nodes]
+
+    def _new_node_bound(self, route: Route, search: "_BestRouteSearch") -> int:
+        # Upper bound on the number of new nodes of any complete route that starts with this route.
+        # A node v can still be added from the current node u only if we can get to it and back
+        # with the remaining distance, and d(u, v) >= d(source, v) - d(source, u) by the triangle
+        # inequality, so 2 d(source, v) <= remaining + d(source, u).
+        remaining = self.max_distance - route.distance
+        d_u = search.distance_from_source[self.csr.index[route.nodes[-1]]]
+        threshold = (remaining + d_u) / 2 + 1e-9
+        candidates = (bisect.bisect_right(search.candidate_distances, threshold)
+                      - bisect.bisect_right(search.route_distances, threshold))
+
+        # every new node also takes at least one more edge
+        if search.min_length > 0:
+            candidates = min(candidates, int(remaining / search.min_length + 1e-9))
+
+        return len(search.route_distances) + candidates
+
+    def _search_best_route(self, route: Route, search: "_BestRouteSearch",
+                           budget: Optional["_Budget"] = None) -> bool:
+        # Same explicit-stack DFS as _iter_routes, with branches pruned by _new_node_bound.
+        # Returns False if the search was stopped because the budget ran out.
+        stats = self._counters()
+        if search.cannot_beat(self._new_node_bound(route, search)):
+            return True
+        stack = [iter(self.get_viable_edges(route))]
+        is_leaf = [True]  # whether the route at each depth turned out to have no viable edges
+        while stack:
+            e = next(stack[-1], None)
+            if e is None:
+                stack.pop()
+                if is_leaf.pop():
+                    stats.routes_emitted += 1
+                    if len(search.route_distances) > search.score_to_beat:
+                        search.set_best_route(route)
+                if stack:
+                    search.remove_node(self.csr.index[route.nodes[-1]])
+                    route.pop_edge()  # backtracking
+                    stats.backtracks += 1
+                continue
+
+            is_leaf[-1] = False
+            if budget is not None and not budget.spend():
+                return False
+            if self._extend_best_route(route, search, e, stats):
+                stack.append(iter(self.get_viable_edges(route)))
+                is_leaf.append(True)
+        return True
+
+    def _extend_best_route(self, route: Route, search: "_BestRouteSearch", e: Edge,
+                           stats: SearchStats) -> bool:
+        # Add an edge to the route searched by _search_best_route. Returns False (and takes the
+        # edge off again) if no route in the branch can beat the best one found so far.
+        route.add_edge(e)
+        search.add_node(self.csr.index[e.v])
+        stats.edges_expanded += 1
+        if search.cannot_beat(self._new_node_bound(route, search)):
+            search.remove_node(self.csr.index[e.v])
+            route.pop_edge()
+            stats.backtracks += 1
+            return False
+        return True
+
+    def best_route(self, processes: Optional[int] = None,
+                   split_depth: int = 1) -> Tuple[Route, int]:
+        """Find the route with the largest number of new (unvisited) nodes, using branch and bound.
+
+        This is the same search as ``brute_force``, except that a partial route is abandoned
+        as soon as an upper bound on the number of new nodes it could still reach shows that
+        it cannot beat the best route found so far. The route returned is the first one that
+        ``brute_force`` would return among the routes chosen by ``maximize_new_nodes``.
+
+        :param processes: If given, the search is split into independent subtrees (see ``split``)
+            that are explored by this many worker processes, which share the best score found so far
+        :type processes: int, optional
+        :param split_depth: Number of edges at which the search is split,
+            when using worker processes
+        :type split_depth: int
+        :return: The best route, and its number of new nodes
+        :rtype: Tuple[Route, int]
+        """
+        with self._phase('best_route'):
+            if processes is None:
+                route = Route()
+                route.nodes.append(self.source)
+                best_route, best_score = self._best_route_from(route)
+            else:
+                best_route, best_score = None, -1
+                with self._pool(processes) as pool:
+                    for route, score in pool.imap(_best_route_subtree, self.split(split_depth)):
+                        # ties go to the earlier subtree, as they would in a single search
+                        if score > best_score:
+                            best_route, best_score = route, score
+        self._trace('best_route')
+        return best_route, best_score
+
+    def _best_route_from(self, route: Route, shared_best: Optional[multiprocessing.Value] = None,
+                         incumbent: Optional[Tuple[Route, int]] = None
+                         ) -> Tuple[Optional[Route], int]:
+        search = _BestRouteSearch(self, shared_best, incumbent)
+        for n in route.nodes:
+            search.add_node(self.csr.index[n])
+        self._search_best_route(route, search)
+        return search.best_route, search.best_score
+
+    def with_max_distance(self, max_distance: float) -> "RouteFinder":
+        """Create a finder for the same graph, source and visited nodes,
+        with a smaller maximum distance. It shares this finder's distance table and cache
+        of incident edges (which do not depend on the maximum distance), so that the work done
+        for one of them is not repeated for the other.
+        Nodes marked as visited afterwards are not shared.
+
+        :param max_distance: Maximum distance for the route, at most ``self.max_distance``
+        :type max_distance: float
+        :return: The new finder
+        :rtype: RouteFinder
+        :raises ValueError: If the maximum distance is larger than this finder's
+        """
+        if max_distance > self.max_distance:
+            raise ValueError(f'max_distance {max_distance} is larger than {self.max_distance}')
+        rf = RouteFinder(self.csr, self.source, max_distance,
+                         distance_from_source=self.get_distance_from_source(),
+                         stats=self.stats, tracer=self.tracer, cache_size=self.cache_size)
+        # (the graph is already this finder's subgraph if it is pruned, so it is not pruned again,
+        # but nodes outside of the subgraph are ignored in the same way)
+        rf._pruned = self._pruned
+        rf._source_index = self._source_index
+        rf.visited = bytearray(self.visited)
+        rf._incident_cache = self._incident_cache
+        self._owns_copies = False  # (now shared with the new finder)
+        return rf
+
+    def sweep(self, budgets: Iterable[float], best: bool = False) -> List[SweepResult]:
+        """Find routes for several maximum distances from the same source at once,
+        e.g. to offer a choice of route lengths. The distance table is computed only once
+        (for this finder's maximum distance) and the cache of incident edges is shared.
+
+        Each maximum distance gets the route of ``greedy_nearest`` and, if asked for, a route with
+        the largest number of new nodes as found by ``best_route``. The searches for the best routes
+        go from the smallest maximum distance to the largest, and every search starts out with the
+        best route for the previous maximum distance (which is also short enough for the next one)
+        as the route to beat, so that many branches are pruned from the start. It only keeps its
+        place if no route found by the search ties with it, so the routes are the same as those of
+        ``best_route`` for each maximum distance on its own. Every route is found from the visited
+        nodes as they are now, and no nodes are marked as visited.
+
+        :param budgets: Maximum distances, each at most ``self.max_distance``
+        :type budgets: Iterable[float]
+        :param best: If True, also find the route with the most new nodes for each maximum distance
+        :type best: bool
+        :return: One result per maximum distance, in the same order as ``budgets``
+        :rtype: List[SweepResult]
+        """
+        budgets = list(budgets)
+        results: Dict[int, SweepResult] = {}
+        incumbent: Optional[Tuple[Route, int]] = None
+        for k in sorted(range(len(budgets)), key=lambda k: budgets[k]):
+            route = self.with_max_distance(budgets[k]).greedy_nearest()
+            new_nodes = self.count_new_nodes(route)
+            if not best:
+                results[k] = SweepResult(budgets[k], route, new_nodes)
+                continue
+
+            if incumbent is None or new_nodes > incumbent[1]:
+                incumbent = (route, new_nodes)
+            rf = self.with_max_distance(budgets[k])
+            start = Route()
+            start.nodes.append(self.source)
+            with rf._phase('best_route'):
+                incumbent = rf._best_route_from(start, incumbent=incumbent)
+            results[k] = SweepResult(budgets[k], route, new_nodes, *incumbent)
+        return [results[k] for k in range(len(budgets))]
+
+    def anytime_route(self, time_limit: Optional[float] = None,
+                      max_expansions: Optional[int] = None) -> SearchResult:
+        """Find a route with as many new (unvisited) nodes as possible within a limited amount
+        of work.
+
+        The route found by ``greedy_nearest`` is taken as the best route so far, and then the
+        branch and bound search of ``best_route`` looks for better ones until it finishes
+        or the limits are reached. If the limits are reached while the greedy route is still
+        being built, it is closed by the shortest path back to the source.
+        Unlike ``greedy_nearest``, no nodes are marked as visited.
+
+        :param time_limit: Stop once this many seconds have passed since the search started
+        :type time_limit: float, optional
+        :param max_expansions: Stop once routes have been extended by this many edges in total
+        :type max_expansions: int, optional
+        :return: The best route found, its number of new nodes, and whether the search finished
+            (in which case no route has more new nodes, and the route is the one ``best_route``
+            returns)
+        :rtype: SearchResult
+        """
+        budget = _Budget(time_limit, max_expansions)
+        with self._phase('anytime_route'):
+            visited = bytearray(self.visited)
+            try:
+                route, closed = self._greedy_nearest(budget)
+            finally:
+                self.visited[:] = visited
+            new_nodes = self.count_new_nodes(route)
+
+            complete = False
+            if not closed:
+                start = Route()
+                start.nodes.append(self.source)
+                search = _BestRouteSearch(self, incumbent=(route, new_nodes))
+                search.add_node(self._source_index)
+                complete = self._search_best_route(start, search, budget)
+                route, new_nodes = search.best_route, search.best_score
+
+        if self.stats is not None:
+            self.stats.routes_emitted += 1
+        self._trace('anytime_route')
+        return SearchResult(route, new_nodes, complete)
 
     def path_to_next_node(self, route: Route) -> List[int]:
         """Finds the nearest viable unvisited node, and returns the path to it.
@@ -106,52 +783,37 @@ class RouteFinder():
         """
 
         # find the distance of every node from the source (out to max dist/2)
-        if self.distance_from_source is None:
-            self.distance_from_source = nx.single_source_dijkstra_path_length(self.G, self.source,
-                                                                              cutoff=self.max_distance / 2,
-                                                                              weight='length')
-
-        # find the distance of every node from current node u
-        u = route.nodes[-1]
-        distance_from_u, path_from_u = nx.single_source_dijkstra(self.G, u, target=None,
-                                                                 cutoff=self.max_distance - route.distance,
-                                                                 weight='length')
-        del distance_from_u[u]  # we do not allow going from u to u
-        distance_from_u = dict(sorted(distance_from_u.items(), key=lambda item: item[1]))
-
-        closest_viable_visited_node = None
-        for v in distance_from_u.keys():
-            if (v in self.distance_from_source) and (route.distance + distance_from_u[v] + self.distance_from_source[v] <= self.max_distance):
-                if graph_utils.is_unvisited(self.G, v):
-                    return path_from_u[v]
+        distance_from_source = self.get_distance_from_source()
+
+        # Visit nodes in order of increasing distance from the current node u, stopping at the first
+        # unvisited one. Nodes that we could not get back to the source from are never reached:
+        # they cannot be the next node, and the path to a viable node never goes through them
+        # either.
+        with self._phase('path_to_next_node'):
+            u = self.csr.index[route.nodes[-1]]
+            pred: Dict[int, int] = {}
+            settled = 0
+            next_node = None
+            closest_viable_visited_node = None
+            for v, _ in self.csr.iter_dijkstra(u, cutoff=self.max_distance - route.distance,
+                                               pred=pred, onward_distance=distance_from_source):
+                settled += 1
+                if v == u:
+                    continue  # we do not allow going from u to u
+                if not self.visited[v]:
+                    next_node = v
+                    break
                 elif closest_viable_visited_node is None:
                     closest_viable_visited_node = v
 
-        return path_from_u[closest_viable_visited_node]
-
-    def _recursive_greedy_nearest(self, route: Route) -> None:
-        viable_edges = self.get_viable_edges(route)
-
-        # if none of the adjacent nodes are viable, route must be completed
-        if len(viable_edges) == 0:
-            return
-
-        # check whether any viable incident edges go to an unvisited node
-        edges_to_unvisited = [e for e in viable_edges if graph_utils.is_edge_to_unvisited_node(self.G, e)]
-
-        if edges_to_unvisited:
-            e = edge.shortest_edge(edges_to_unvisited)
-            route.add_edge(e)
-            graph_utils.mark_as_visited(self.G, e.v)
-        else:
-            # if none of the adjacent nodes are unvisited, look further for the next node
-            path = self.path_to_next_node(route)
-            edges = graph_utils.get_edges_from_path(self.G, path)
-            for e in edges:
-                route.add_edge(e)
-                graph_utils.mark_as_visited(self.G, e.v)
+            if next_node is None:
+                next_node = closest_viable_visited_node
+            path = self.csr.path_from_pred(pred, u, next_node)
 
-        self._recursive_greedy_nearest(route)
+        if self.stats is not None:
+            self.stats.shortest_path_queries += 1
+            self.stats.nodes_settled += settled
+        return path
 
     def greedy_nearest(self) -> Route:
         """Generates a route by using a greedy algorithm: the next node is always chosen
@@ -161,8 +823,210 @@ class RouteFinder():
         :return: Route found using a greedy algorithm
         :rtype: Route
         """
+        with self._phase('greedy_nearest'):
+            route, _ = self._greedy_nearest()
+        if self.stats is not None:
+            self.stats.routes_emitted += 1
+            self.stats.edges_expanded += len(route.edges)
+        self._trace('greedy_nearest')
+        return route
+
+    def _greedy_nearest(self, budget: Optional["_Budget"] = None) -> Tuple[Route, bool]:
+        # Returns the route, and True if the budget ran out and the route had to be closed early
         route = Route()
         route.nodes.append(self.source)
-        graph_utils.mark_as_visited(self.G, self.source)
-        self._recursive_greedy_nearest(route)
-        return route
+        self.mark_as_visited(self.source)
+
+        while True:
+            viable_edges = self.get_viable_edges(route)
+
+            # if none of the adjacent nodes are viable, route must be completed
+            if len(viable_edges) == 0:
+                return route, False
+
+            if budget is not None and budget.exhausted():
+                for e in self.csr.edges_from_path(self.path_to_source(route.nodes[-1])):
+                    route.add_edge(e)
+                return route, True
+
+            # check whether any viable incident edges go to an unvisited node
+            edges_to_unvisited = [e for e in viable_edges if self.is_unvisited(e.v)]
+
+            if edges_to_unvisited:
+                e = edge.shortest_edge(edges_to_unvisited)
+                route.add_edge(e)
+                self.mark_as_visited(e.v)
+                if budget is not None:
+                    budget.expansions += 1
+            else:
+                # if none of the adjacent nodes are unvisited, look further for the next node
+                path = self.path_to_next_node(route)
+                edges = self.csr.edges_from_path(path)
+                for e in edges:
+                    route.add_edge(e)
+                    self.mark_as_visited(e.v)
+                if budget is not None:
+                    budget.expansions += len(edges)
+
+    def path_to_source(self, u: int) -> List[int]:
+        """Return a shortest path from a node back to the source,
+        found with ``CSRGraph.shortest_path`` (an A* search when the graph has coordinates,
+        and a bidirectional search otherwise).
+        ``anytime_route`` uses it to close its route when the budget runs out; it is the only
+        search of the finder between two given nodes.
+
+        :param u: Node no farther than half of the maximum distance from the source
+        :type u: int
+        :return: Path from the node to the source
+        :rtype: List[int]
+        """
+        _, path = self.csr.shortest_path(self.csr.index[u], self._source_index,
+                                         cutoff=self.max_distance / 2)
+        if self.stats is not None:
+            self.stats.shortest_path_queries += 1
+        return path
+
+
+_HASH_MASK = (1 << 64) - 1
+
+
+def _route_key(route: CompactRoute, edge_hashes: List[int]) -> Tuple[int, int]:
+    # identifies a route up to the order of its edges:
+    # the sum of the hashes of its edges, and its last node
+    return sum(edge_hashes[s] for s in route.slots) & _HASH_MASK, route.nodes[-1]
+
+
+class _SeenRoutes():
+    """Partial routes already searched by ``RouteFinder._iter_routes`` when it skips equivalent
+    routes, each identified by the sum of the hashes of its edges and its last node
+    (see ``_route_key``).
+    """
+    def __init__(self, seen: set, route: CompactRoute, csr: CSRGraph) -> None:
+        self.seen = seen
+        self.edge_hashes: List[int] = csr.edge_hashes().tolist()
+        self.hash = _route_key(route, self.edge_hashes)[0]  # hash of the route last extended
+        seen.add(_route_key(route, self.edge_hashes))
+
+    def unseen(self, viable_slots: List[Tuple[int, int, float]]
+               ) -> Iterator[Tuple[int, int, float]]:
+        # The viable slots from the last node of the route last extended, leaving out those that
+        # extend it to a partial route already seen. Each one is checked only when it is reached,
+        # since the searches from the ones before it add to what has been seen.
+        h = self.hash
+        for e in viable_slots:
+            key = ((h + self.edge_hashes[e[0]]) & _HASH_MASK, e[1])
+            if key not in self.seen:
+                self.seen.add(key)
+                self.hash = key[0]
+                yield e
+
+
+class _Incident(NamedTuple):
+    """Cached incident edges of a node, as used by ``RouteFinder.get_viable_edges``.
+    """
+    edges: List[Edge]
+    return_distance: List[float]  # distance of going along each edge and then back to the source
+    neighbors: List[int]  # node index at the other end of each edge
+    first_slot: int  # slot of the first edge (the others follow in order)
+
+
+class _BestRouteSearch():
+    """Bookkeeping for ``RouteFinder.best_route``: the best route found so far,
+    and which new nodes the current partial route has visited (and how many times).
+    """
+    def __init__(self, rf: RouteFinder, shared_best: Optional[multiprocessing.Value] = None,
+                 incumbent: Optional[Tuple[Route, int]] = None) -> None:
+        self.distance_from_source = rf.get_distance_from_source()
+        self.visited = rf.visited
+
+        # sorted distances from the source of all unvisited nodes that could be part of a route
+        unvisited = np.frombuffer(bytes(rf.visited), dtype=np.uint8) == 0
+        candidates = np.isfinite(self.distance_from_source) & unvisited
+        candidate_distances = np.sort(self.distance_from_source[candidates])
+        self.candidate_distances: List[float] = candidate_distances.tolist()
+        self.min_length = float(rf.csr.lengths.min()) if len(rf.csr.lengths) else 0.0
+
+        self.counts: Dict[int, int] = {}  # number of times the route visits each new node
+        # sorted distances from the source of the route's new nodes
+        self.route_distances: List[float] = []
+
+        # A route found some other way (with its score) can be given as the best route so far.
+        # Routes found by the search win ties against it, so that the route found is the same
+        # as without it, but branches that cannot even tie are pruned from the start.
+        self.best_route: Optional[Route] = None if incumbent is None else incumbent[0]
+        self.best_score = -1 if incumbent is None else incumbent[1]
+        # score a route has to beat to become the best route
+        self.score_to_beat = -1 if incumbent is None else incumbent[1] - 1
+
+        # best score found by any of the processes searching other subtrees in parallel
+        self.shared_best = shared_best
+
+    def cannot_beat(self, bound: int) -> bool:
+        # Routes from other subtrees win ties, so they only rule out routes that are strictly worse
+        return bound <= self.score_to_beat or (self.shared_best is not None
+                                               and bound < self.shared_best.value)
+
+    def set_best_route(self, route: Route) -> None:
+        self.best_route = route.copy()
+        self.best_score = self.score_to_beat = len(self.route_distances)
+        if self.shared_best is not None:
+            with self.shared_best.get_lock():
+                self.shared_best.value = max(self.shared_best.value, self.best_score)
+
+    def add_node(self, i: int) -> None:
+        if self.visited[i]:
+            return
+        self.counts[i] = self.counts.get(i, 0) + 1
+        if self.counts[i] == 1:
+            bisect.insort(self.route_distances, float(self.distance_from_source[i]))
+
+    def remove_node(self, i: int) -> None:
+        if self.visited[i]:
+            return
+        self.counts[i] -= 1
+        if self.counts[i] == 0:
+            del self.counts[i]
+            self.route_distances.remove(float(self.distance_from_source[i]))
+
+
+class _Budget():
+    """Limits on the work done by ``RouteFinder.anytime_route``.
+    """
+    def __init__(self, time_limit: Optional[float], max_expansions: Optional[int]) -> None:
+        self.deadline = None if time_limit is None else time.perf_counter() + time_limit
+        self.max_expansions = max_expansions
+        self.expansions = 0  # number of edges that routes have been extended by so far
+
+    def exhausted(self) -> bool:
+        return ((self.max_expansions is not None and self.expansions >= self.max_expansions)
+                or (self.deadline is not None and time.perf_counter() > self.deadline))
+
+    def spend(self) -> bool:
+        # counts one more expansion, or returns False if the budget has run out
+        if self.exhausted():
+            return False
+        self.expansions += 1
+        return True
+
+
+# the finder used by a worker process, when a search is split across processes
+_worker_finder: Optional[RouteFinder] = None
+_worker_best: Optional[multiprocessing.Value] = None
+
+
+def _init_worker(csr: CSRGraph, source: int, max_distance: float, distance_from_source: np.ndarray,
+                 visited: bytearray, shared_best: multiprocessing.Value) -> None:
+    global _worker_finder, _worker_best
+    _worker_finder = RouteFinder(csr, source, max_distance,
+                                 distance_from_source=distance_from_source)
+    _worker_finder.visited = visited
+    _worker_best = shared_best
+
+
+def _brute_force_subtree(route: Route, dedup: bool = False) -> List[CompactRoute]:
+    start = CompactRoute.from_route(route, _worker_finder.csr)
+    return list(_worker_finder._iter_routes(start, None, set() if dedup else None))
+
+
+def _best_route_subtree(route: Route) -> Tuple[Optional[Route], int]:
+    return _worker_finder._best_route_from(route, _worker_best)
@@ -0,0 +1,56 @@
+import contextlib
+import time
+from typing import Dict, Iterator, Union
+
+
+class SearchStats():
+    """Counters and timers for the work done by a ``RouteFinder``.
+    A finder only keeps them if it was given a ``SearchStats``.
+
+    :ivar shortest_path_queries: Number of Dijkstra searches run
+    :ivar nodes_settled: Number of nodes settled by those searches
+    :ivar edges_expanded: Number of times an edge was added to a route during a search
+    :ivar routes_emitted: Number of complete routes found
+    :ivar backtracks: Number of times an edge was removed again during a depth first search
+    :ivar phase_times: Total time in seconds spent in each phase of the searches
+    """
+    def __init__(self) -> None:
+        """Create a new set of statistics, with every counter at zero.
+        """
+        self.shortest_path_queries: int = 0
+        self.nodes_settled: int = 0
+        self.edges_expanded: int = 0
+        self.routes_emitted: int = 0
+        self.backtracks: int = 0
+        self.phase_times: Dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Context manager that adds the time spent inside it to ``phase_times[name]``.
+
+        :param name: Name of the phase
+        :type name: str
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[name] = self.phase_times.get(name, 0.0) + time.perf_counter() - start
+
+    def as_dict(self) -> Dict[str, Union[int, float]]:
+        """Return all the counters and phase times as a flat dictionary,
+        with phase times under keys of the form ``time_<phase>``.
+
+        :return: Dictionary of statistics
+        :rtype: Dict[str, Union[int, float]]
+        """
+        stats: Dict[str, Union[int, float]] = {
+            'shortest_path_queries': self.shortest_path_queries,
+            'nodes_settled': self.nodes_settled,
+            'edges_expanded': self.edges_expanded,
+            'routes_emitted': self.routes_emitted,
+            'backtracks': self.backtracks,
+        }
+        for name, seconds in self.phase_times.items():
+            stats['time_' + name] = seconds
+        return stats
@@ -0,0 +1,178 @@
+import csr_graph
+from csr_graph import CSRGraph
+import json
+import math
+import networkx as nx
+import numpy as np
+import os
+from typing import Tuple, Union
+
+
+class TileIndex():
+    """Spatial index over a large graph (e.g. a whole region), which splits it into square tiles
+    by node coordinates, so that the part of the graph around a point can be extracted without
+    reading the rest of it.
+
+    The nodes of the graph are reordered so that the nodes (and slots) of each tile
+    are stored together.
+    Once saved and loaded again memory-mapped, extracting the graph around a point then only reads
+    the few tiles that it overlaps.
+
+    :ivar csr: The graph, with its nodes ordered by tile
+    :ivar tile_size: Width and height of each tile, in the units of the coordinates
+        (degrees for longitude/latitude coordinates)
+    :ivar tiles: Sorted code of each tile that has nodes (see ``_tile_codes``)
+    :ivar tile_offsets: Index of the first node of each tile, with one extra entry at the end
+    :ivar sorted_ids: Sorted original node ids, to look nodes up without building ``csr.index``
+    :ivar sorted_index: Node index of each node id in ``sorted_ids``
+    """
+    # arrays saved next to the graph's arrays in a snapshot directory
+    _arrays = ['tiles', 'tile_offsets', 'sorted_ids', 'sorted_index']
+
+    def __init__(self, csr: CSRGraph, tile_size: float, tiles: np.ndarray, tile_offsets: np.ndarray,
+                 sorted_ids: np.ndarray, sorted_index: np.ndarray) -> None:
+        """Create a TileIndex from its arrays. Use ``build`` to build one from a graph.
+
+        :param csr: The graph, with its nodes ordered by tile
+        :type csr: CSRGraph
+        :param tile_size: Width and height of each tile
+        :type tile_size: float
+        :param tiles: Sorted code of each tile that has nodes
+        :type tiles: ndarray
+        :param tile_offsets: Index of the first node of each tile, with one extra entry at the end
+        :type tile_offsets: ndarray
+        :param sorted_ids: Sorted original node ids
+        :type sorted_ids: ndarray
+        :param sorted_index: Node index of each node id in ``sorted_ids``
+        :type sorted_index: ndarray
+        """
+        self.csr = csr
+        self.tile_size = tile_size
+        self.tiles = tiles
+        self.tile_offsets = tile_offsets
+        self.sorted_ids = sorted_ids
+        self.sorted_index = sorted_index
+
+    @classmethod
+    def build(cls, G: Union[nx.MultiGraph, CSRGraph], tile_size: float) -> "TileIndex":
+        """Build a tile index over a graph with node coordinates and a crs
+        (as graphs from ``osmnx``).
+
+        :param G: Input graph
+        :type G: MultiGraph or CSRGraph
+        :param tile_size: Width and height of each tile, in the units of the coordinates.
+            Tiles about as large as the shortest routes that will be searched for work well.
+        :type tile_size: float
+        :return: The tile index
+        :rtype: TileIndex
+        :raises ValueError: If the graph has no coordinates or no crs
+        """
+        csr = G if isinstance(G, CSRGraph) else CSRGraph.from_networkx(G)
+        if csr.x is None or csr.crs is None:
+            raise ValueError('a TileIndex needs a graph with node coordinates and a crs')
+
+        codes = _tile_codes(np.floor(csr.x / tile_size), np.floor(csr.y / tile_size))
+        order = np.argsort(codes, kind='stable')
+        csr = csr.subgraph(order)
+        codes = codes[order]
+
+        tiles, tile_offsets = np.unique(codes, return_index=True)
+        tile_offsets = np.append(tile_offsets, len(codes)).astype(np.int64)
+        sorted_index = np.argsort(csr.node_ids, kind='stable')
+        return cls(csr, tile_size, tiles, tile_offsets, csr.node_ids[sorted_index], sorted_index)
+
+    def save(self, path: str) -> None:
+        """Save the tile index as a snapshot directory (see ``CSRGraph.save``), which can be loaded
+        again quickly with ``load``.
+
+        :param path: Path of the snapshot directory (created if it does not exist)
+        :type path: str
+        """
+        self.csr.save(path)
+        for name in self._arrays:
+            np.save(os.path.join(path, name + '.npy'), getattr(self, name))
+        with open(os.path.join(path, 'tile_index.json'), 'w') as f:
+            json.dump({'tile_size': self.tile_size}, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "TileIndex":
+        """Load a tile index that was saved with ``save``.
+
+        :param path: Path of the snapshot directory
+        :type path: str
+        :param mmap: If True, the arrays are memory-mapped instead of read into memory,
+            so that only the tiles that are used are ever read
+        :type mmap: bool
+        :return: The loaded tile index
+        :rtype: TileIndex
+        """
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r' if mmap else None)
+                  for name in cls._arrays}
+        with open(os.path.join(path, 'tile_index.json')) as f:
+            meta = json.load(f)
+        return cls(CSRGraph.load(path, mmap=mmap), meta['tile_size'], **arrays)
+
+    def node_index(self, n: int) -> int:
+        """Look up the node index of a node in ``self.csr``.
+
+        :param n: Node (original node id)
+        :type n: int
+        :return: Node index
+        :rtype: int
+        :raises KeyError: If the node is not in the graph
+        """
+        i = int(np.searchsorted(self.sorted_ids, n))
+        if i == len(self.sorted_ids) or self.sorted_ids[i] != n:
+            raise KeyError(n)
+        return int(self.sorted_index[i])
+
+    def _radius_in_coordinates(self, y: float, radius: float) -> Tuple[float, float]:
+        # Largest difference in x and in y between a point at latitude y and any point whose
+        # shortest path from it is at most radius long. Edges are never shorter than the straight
+        # line (or great circle) between their ends, apart from rounding, which
+        # CSRGraph.shortest_path also allows for.
+        radius /= csr_graph._BOUND_SCALE
+        if str(self.csr.crs).lower() not in csr_graph._GEOGRAPHIC_CRS:
+            return radius, radius
+
+        angle = radius / csr_graph._EARTH_RADIUS_M
+        ry = math.degrees(angle)
+        cos_y = math.cos(math.radians(y))
+        if angle >= math.pi / 2 or math.sin(angle) >= cos_y:
+            return 360.0, ry  # close enough to a pole to reach every longitude
+        return math.degrees(math.asin(math.sin(angle) / cos_y)), ry
+
+    def extract(self, source: int, radius: float) -> CSRGraph:
+        """Extract the part of the graph that is needed around a node: the subgraph of the nodes
+        in all the tiles that overlap a square around the node, which includes every node
+        whose shortest path from the node is at most the radius long.
+
+        :param source: Node (original node id)
+        :type source: int
+        :param radius: Largest distance of the nodes that are needed, in the units of the edge
+            lengths (meters for longitude/latitude coordinates)
+        :type radius: float
+        :return: The subgraph
+        :rtype: CSRGraph
+        """
+        i = self.node_index(source)
+        x, y = float(self.csr.x[i]), float(self.csr.y[i])
+        rx, ry = self._radius_in_coordinates(y, radius)
+
+        ty0, ty1 = math.floor((y - ry) / self.tile_size), math.floor((y + ry) / self.tile_size)
+        ranges = []
+        tx0, tx1 = math.floor((x - rx) / self.tile_size), math.floor((x + rx) / self.tile_size)
+        for tx in range(tx0, tx1 + 1):
+            # the tiles of one column are next to each other, sorted by y
+            first, last = _tile_codes(np.array([tx, tx]), np.array([ty0, ty1]))
+            lo = np.searchsorted(self.tiles, first, side='left')
+            hi = np.searchsorted(self.tiles, last, side='right')
+            if lo < hi:
+                ranges.append(np.arange(self.tile_offsets[lo], self.tile_offsets[hi]))
+        return self.csr.subgraph(np.concatenate(ranges) if ranges else np.zeros(0, dtype=np.int64))
+
+
+def _tile_codes(tx: np.ndarray, ty: np.ndarray) -> np.ndarray:
+    # one integer per tile, sorted by the column (x) of the tile and then by its row (y)
+    offset = 1 << 31
+    return (tx.astype(np.int64) + offset) * (1 << 32) + (ty.astype(np.int64) + offset)
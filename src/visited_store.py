@@ -0,0 +1,89 @@
+from csr_graph import CSRGraph
+import numpy as np
+import os
+from route import Route
+from typing import Iterable, Optional
+
+
+class VisitedStore():
+    """Persistent set of visited nodes, keyed by original node id (e.g. OSM id),
+    so that a runner's history can be kept across many runs and many finders.
+
+    The node ids are kept as a sorted array without duplicates, which is saved as a ``.npy`` file
+    and memory-mapped when it is loaded, so loading even a long history is cheap.
+
+    :ivar node_ids: Sorted array of the visited node ids
+    """
+    def __init__(self, node_ids: Optional[Iterable[int]] = None) -> None:
+        """Create a store holding the given visited nodes (or no nodes).
+
+        :param node_ids: Visited nodes
+        :type node_ids: Iterable[int], optional
+        """
+        if node_ids is None:
+            node_ids = []
+        self.node_ids: np.ndarray = np.unique(np.fromiter(node_ids, dtype=np.int64))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "VisitedStore":
+        """Load a store that was saved with ``save``.
+
+        :param path: Path of the ``.npy`` file
+        :type path: str
+        :param mmap: If True, memory-map the file instead of reading it into memory
+        :type mmap: bool
+        :return: The loaded store
+        :rtype: VisitedStore
+        """
+        store = cls()
+        store.node_ids = np.load(path, mmap_mode='r' if mmap else None)
+        return store
+
+    def save(self, path: str) -> None:
+        """Save the store as a ``.npy`` file. The file is replaced in one step,
+        so stores that have the old file memory-mapped are not affected.
+
+        :param path: Path of the ``.npy`` file
+        :type path: str
+        """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.asarray(self.node_ids, dtype=np.int64))
+        os.replace(tmp_path, path)
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    def __contains__(self, n: int) -> bool:
+        i = np.searchsorted(self.node_ids, n)
+        return bool(i < len(self.node_ids) and self.node_ids[i] == n)
+
+    def add(self, node_ids: Iterable[int]) -> None:
+        """Add nodes to the store.
+
+        :param node_ids: Nodes to add
+        :type node_ids: Iterable[int]
+        """
+        self.node_ids = np.union1d(self.node_ids, np.fromiter(node_ids, dtype=np.int64))
+
+    def commit(self, route: Route) -> None:
+        """Add all the nodes of a completed route to the store.
+
+        :param route: Completed route
+        :type route: Route
+        """
+        self.add(route.nodes)
+
+    def mask(self, csr: CSRGraph) -> np.ndarray:
+        """Find which nodes of a graph are in the store.
+
+        :param csr: Input graph
+        :type csr: CSRGraph
+        :return: Boolean array indexed by node index, True for the nodes in the store
+        :rtype: ndarray
+        """
+        if len(self.node_ids) == 0:
+            return np.zeros(csr.number_of_nodes(), dtype=bool)
+        i = np.searchsorted(self.node_ids, csr.node_ids)
+        i[i == len(self.node_ids)] = 0
+        return self.node_ids[i] == csr.node_ids
@@ -1,6 +1,9 @@
 import pytest
+import hashlib
 import os
+import shutil
 import networkx as nx
+import numpy as np
 
 # Force geopandas to use Shapely 2.0 instead of PyGEOS
 # (PyGEOS was merged with Shapely, and will stop working in a future release of GeoPandas)
@@ -8,6 +11,21 @@ os.environ['USE_PYGEOS'] = '0'
 
 import osmnx as ox
 
+from csr_graph import CSRGraph
+
+# options for downloading and simplifying the G fixture, which also identify its snapshot
+DOWNLOAD_OPTIONS = dict(dist=1000,  # meters from center
+                        dist_type='bbox',
+                        network_type='drive',
+                        simplify=False,
+                        retain_all=True,
+                        truncate_by_edge=False,
+                        clean_periphery=False,
+                        custom_filter=None)
+SIMPLIFY_OPTIONS = dict(strict=False,
+                        remove_rings=False,
+                        track_merged=False)
+
 
 @pytest.fixture
 def center_point():
@@ -15,24 +33,31 @@ def center_point():
 
 
 @pytest.fixture
-def G(center_point):
-    MDG = ox.graph.graph_from_point(center_point=center_point,
-                                    dist=1000,  # meters from center
-                                    dist_type='bbox',
-                                    network_type='drive',
-                                    simplify=False,
-                                    retain_all=True,
-                                    truncate_by_edge=False,
-                                    clean_periphery=False,
-                                    custom_filter=None)
+def G(center_point, request):
+    # the graph is downloaded once and then kept as a snapshot in pytest's cache directory,
+    # keyed by everything it was downloaded with, so that changing any of it downloads it again
+    options = repr((center_point, sorted(DOWNLOAD_OPTIONS.items()), sorted(SIMPLIFY_OPTIONS.items())))
+    key = hashlib.blake2b(options.encode(), digest_size=8).hexdigest()
+    path = os.path.join(str(request.config.cache.mkdir('G')), key)
+    if os.path.isdir(path):
+        return CSRGraph.load(path).to_networkx()
+
+    MDG = ox.graph.graph_from_point(center_point=center_point, **DOWNLOAD_OPTIONS)
 
     # Remove interstitial nodes (nodes that are not intersections or dead-ends)
-    MDG = ox.simplification.simplify_graph(MDG,
-                                           strict=False,
-                                           remove_rings=False,
-                                           track_merged=False)
+    MDG = ox.simplification.simplify_graph(MDG, **SIMPLIFY_OPTIONS)
 
     MG = ox.utils_graph.get_undirected(MDG)
+
+    # saved in a temporary directory first and then renamed in one step,
+    # so that an interrupted run never leaves half a snapshot behind
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    CSRGraph.from_networkx(MG).save(tmp_path)
+    try:
+        os.replace(tmp_path, path)
+    except OSError:  # (another run saved it first)
+        shutil.rmtree(tmp_path, ignore_errors=True)
     return MG
 
 
@@ -57,3 +82,20 @@ def grid():
 
     nx.set_edge_attributes(G, name='length', values=1.0)
     return G
+
+
+@pytest.fixture
+def street_grid():
+    def make(n, crs, scale, seed=0):
+        # an n by n grid with coordinates (scale apart), where every edge is 100 to 150 long,
+        # which is longer than the straight line between its ends
+        rng = np.random.default_rng(seed)
+        G = nx.MultiGraph(crs=crs)
+        for i in range(n):
+            for j in range(n):
+                G.add_node(i * n + j, x=j * scale, y=i * scale)
+        for u in range(n * n):
+            for v in ([u + 1] if u % n < n - 1 else []) + ([u + n] if u + n < n * n else []):
+                G.add_edge(u, v, length=rng.uniform(1.0, 1.5) * 100.0)
+        return G
+    return make
@@ -0,0 +1,29 @@
+import pytest
+import batch
+from route_finder import RouteFinder
+
+
+@pytest.fixture
+def jobs():
+    return [(0, 4.0), (1, 4.0), (0, 6.0, [2, 3]), batch.BatchJob(5, 8.0)]
+
+
+def expected(grid, jobs):
+    jobs = [batch.BatchJob(*job) for job in jobs]
+    return [RouteFinder(grid, job.source, job.max_distance, visited=job.visited).greedy_nearest().nodes
+            for job in jobs]
+
+
+def test_greedy_nearest_batch(grid, jobs):
+    results = batch.greedy_nearest_batch(grid, jobs, processes=2)
+    assert [r.route.nodes for r in results] == expected(grid, jobs)
+    assert [(r.source, r.max_distance) for r in results] == [job[:2] for job in jobs]
+    for r in results:
+        assert r.seconds >= 0
+    assert batch._csr is None  # (the graph is not kept alive after the batch)
+
+
+def test_greedy_nearest_batch_single_process(grid, jobs):
+    results = batch.greedy_nearest_batch(grid, jobs, processes=1)
+    assert [r.route.nodes for r in results] == expected(grid, jobs)
+    assert batch._csr is None
@@ -0,0 +1,215 @@
+import pytest
+import numpy as np
+import networkx as nx
+import graph_utils
+import csr_graph
+from csr_graph import CSRGraph
+
+
+@pytest.fixture
+def csr(grid):
+    return CSRGraph.from_networkx(grid)
+
+
+def test_csr_graph(grid, csr):
+    assert csr.number_of_nodes() == 9
+    assert len(csr.offsets) == 10
+    assert len(csr.neighbors) == 2 * grid.number_of_edges()
+    for u in grid.nodes:
+        assert csr.node_ids[csr.index[u]] == u
+
+
+def test_incident_edges(grid, csr):
+    for u in grid.nodes:
+        assert csr.incident_edges(u) == graph_utils.get_incident_edges(grid, u)
+
+
+def test_single_source_dijkstra(csr):
+    distance = csr.single_source_dijkstra(csr.index[0])
+    assert distance[csr.index[0]] == pytest.approx(0.0)
+    assert distance[csr.index[2]] == pytest.approx(1.0)
+    assert distance[csr.index[3]] == pytest.approx(2.0)
+
+    distance = csr.single_source_dijkstra(csr.index[0], cutoff=1.0)
+    assert distance[csr.index[2]] == pytest.approx(1.0)
+    assert np.isinf(distance[csr.index[3]])
+
+
+def test_iter_dijkstra_order(csr):
+    distances = [d for _, d in csr.iter_dijkstra(csr.index[1])]
+    assert distances == sorted(distances)
+    assert len(distances) == 9
+
+
+def test_iter_dijkstra_onward_distance(csr):
+    # only reach nodes that we can still get back to node 0 from, within a total distance of 3
+    onward_distance = csr.single_source_dijkstra(csr.index[0])
+    reached = [int(csr.node_ids[i]) for i, _ in csr.iter_dijkstra(csr.index[2], cutoff=3.0,
+                                                                    onward_distance=onward_distance)]
+    assert sorted(reached) == [0, 1, 2, 3, 4, 6, 8]
+
+
+def test_path_from_pred(csr):
+    pred = {}
+    for _ in csr.iter_dijkstra(csr.index[1], pred=pred):
+        pass
+    path = csr.path_from_pred(pred, csr.index[1], csr.index[5])
+    assert len(path) == 5
+    assert path[0] == 1
+    assert path[-1] == 5
+
+
+def test_edges_from_path(grid):
+    grid.add_edge(0, 2, 1, length=0.5)
+    csr = CSRGraph.from_networkx(grid)
+    edges = csr.edges_from_path([4, 0, 2])
+    assert [tuple(e) for e in edges] == [(4, 0, 0, 1.0), (0, 2, 1, 0.5)]
+
+
+def test_get_csr_graph(grid):
+    csr = csr_graph.get_csr_graph(grid)
+    assert csr_graph.get_csr_graph(grid) is csr
+
+
+def test_coordinates(grid):
+    assert CSRGraph.from_networkx(grid).x is None
+
+    for n in grid.nodes:
+        grid.nodes[n]['x'] = float(n)
+        grid.nodes[n]['y'] = -float(n)
+    csr = CSRGraph.from_networkx(grid)
+    assert csr.x[csr.index[3]] == pytest.approx(3.0)
+    assert csr.y[csr.index[3]] == pytest.approx(-3.0)
+
+
+def test_to_networkx(grid, csr):
+    G = csr.to_networkx()
+    assert sorted(G.nodes) == sorted(grid.nodes)
+    assert (sorted(tuple(sorted(e[:2])) + e[2:] for e in G.edges(keys=True, data='length'))
+            == sorted(tuple(sorted(e[:2])) + e[2:] for e in grid.edges(keys=True, data='length')))
+
+
+def test_save_load(grid, tmp_path):
+    grid.add_edge(1, 2, 1, length=2.5)
+    for n in grid.nodes:
+        grid.nodes[n]['x'] = float(n)
+        grid.nodes[n]['y'] = 0.0
+    grid.graph['crs'] = 'epsg:4326'
+    csr = CSRGraph.from_networkx(grid)
+
+    path = str(tmp_path / 'snapshot')
+    csr.save(path)
+    loaded = CSRGraph.load(path)
+    assert isinstance(loaded.lengths, np.memmap)
+    assert loaded.crs == 'epsg:4326'
+    for name in ['node_ids', 'offsets', 'neighbors', 'keys', 'lengths', 'x', 'y']:
+        assert np.array_equal(getattr(loaded, name), getattr(csr, name))
+    for u in grid.nodes:
+        assert loaded.incident_edges(u) == csr.incident_edges(u)
+
+    G = loaded.to_networkx()
+    assert G.graph['crs'] == 'epsg:4326'
+    assert G.nodes[3]['x'] == pytest.approx(3.0)
+    assert G.edges[1, 2, 1]['length'] == pytest.approx(2.5)
+
+
+def test_shortest_slots(grid):
+    grid.add_edge(2, 0, 2, length=0.5)
+    grid.add_edge(0, 2, 3, length=0.5)
+    csr = CSRGraph.from_networkx(grid)
+    i, j = csr.index[2], csr.index[0]
+    s = csr.shortest_slots(np.array([i, j]), np.array([j, i]))
+    assert csr.keys[s].tolist() == [2, 2]
+    assert csr.neighbors[s].tolist() == [j, i]
+
+    with pytest.raises(KeyError):
+        csr.shortest_slots(np.array([i, csr.index[0]]), np.array([j, csr.index[3]]))
+
+    assert csr.edges_from_path([3, 2, 0]) == graph_utils.get_edges_from_path(grid, [3, 2, 0])
+    assert csr.edges_from_path([3]) == []
+
+
+@pytest.mark.parametrize('crs, scale', [(None, 100.0), ('epsg:32633', 100.0), ('epsg:4326', 0.0008)])
+def test_shortest_path(street_grid, crs, scale):
+    G = street_grid(8, crs, scale)
+    csr = CSRGraph.from_networkx(G)
+    for source, target in [(0, 63), (9, 54), (27, 27), (60, 3)]:
+        distance, path = csr.shortest_path(csr.index[source], csr.index[target])
+        assert distance == pytest.approx(nx.shortest_path_length(G, source, target, weight='length'))
+        assert path[0] == source and path[-1] == target
+        assert sum(e.length for e in csr.edges_from_path(path)) == pytest.approx(distance)
+
+
+def test_shortest_path_cutoff(csr):
+    assert csr.shortest_path(csr.index[0], csr.index[3], cutoff=2.0)[0] == 2.0
+    with pytest.raises(nx.NetworkXNoPath):
+        csr.shortest_path(csr.index[0], csr.index[3], cutoff=1.5)
+
+
+def test_edge_hashes(grid):
+    grid.add_edge(0, 2, 1, length=2.0)
+    csr = CSRGraph.from_networkx(grid)
+    hashes = csr.edge_hashes()
+    assert hashes.dtype == np.uint64
+
+    # both slots of an edge have the same hash, and different edges (even parallel ones) different hashes
+    edges = {}
+    for i in range(csr.number_of_nodes()):
+        for s in csr.slots(i):
+            edge = (min(i, int(csr.neighbors[s])), max(i, int(csr.neighbors[s])), int(csr.keys[s]))
+            assert edges.setdefault(edge, hashes[s]) == hashes[s]
+    assert len(set(edges.values())) == len(edges) == grid.number_of_edges()
+
+
+def test_subgraph(csr, grid):
+    nodes = np.array([csr.index[n] for n in [4, 0, 2, 3]])
+    sub = csr.subgraph(nodes)
+    assert sub.node_ids.tolist() == [4, 0, 2, 3]
+    for u in [4, 0, 2, 3]:
+        # the edges to the nodes that are kept, in the same order
+        assert sub.incident_edges(u) == [e for e in csr.incident_edges(u) if e.v in {4, 0, 2, 3}]
+    assert sub.number_of_nodes() == 4
+    assert len(sub.neighbors) == 2 * 4
+
+    assert csr.subgraph(np.arange(csr.number_of_nodes())).incident_edges(0) == csr.incident_edges(0)
+    assert csr.subgraph(np.zeros(0, dtype=np.int64)).number_of_nodes() == 0
+
+
+def test_ball(csr):
+    ball, distance = csr.ball(csr.index[0], 1.0)
+    assert sorted(ball.node_ids.tolist()) == [0, 2, 4, 6, 8]
+    assert distance.tolist() == [csr.single_source_dijkstra(csr.index[0])[csr.index[n]]
+                                 for n in ball.node_ids.tolist()]
+
+
+def test_with_edge_changes(grid, csr):
+    slots = csr.edge_slots(csr.index[0], csr.index[2], 0)
+    assert sorted(int(csr.node_ids[csr.neighbors[s]]) for s in slots) == [0, 2]
+
+    changed = csr.with_edge_changes({s: 5.0 for s in slots})
+    assert changed.edge_length(changed.index[0], changed.index[2]) == 5.0
+    assert csr.edge_length(csr.index[0], csr.index[2]) == 1.0  # (not modified)
+    assert changed.fingerprint() != csr.fingerprint()
+
+    removed = csr.with_edge_changes(removed=slots)
+    grid.remove_edge(0, 2, 0)
+    for u in grid.nodes:
+        assert removed.incident_edges(u) == graph_utils.get_incident_edges(grid, u)
+    assert np.isinf(removed.edge_length(removed.index[0], removed.index[2]))
+    with pytest.raises(KeyError):
+        removed.edge_slots(removed.index[0], removed.index[2], 0)
+
+
+@pytest.mark.parametrize('length', [None, 0.5, 3.0])
+def test_repair_distances(grid, csr, length):
+    i, j = csr.index[0], csr.index[2]
+    slots = csr.edge_slots(i, j, 0)
+    changed = csr.with_edge_changes(*(({}, slots) if length is None else ({s: length for s in slots},)))
+
+    distance = csr.single_source_dijkstra(csr.index[0], cutoff=2.5)
+    repaired = changed.repair_distances(distance, csr.index[0], [(i, j, 1.0)], cutoff=2.5)
+    assert distance.tolist() == changed.single_source_dijkstra(csr.index[0], cutoff=2.5).tolist()
+    if length != 0.5:
+        assert repaired == [j]  # the other nodes are as close through nodes 4, 6 and 8
+    else:
+        assert j in repaired
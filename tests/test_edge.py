@@ -1,4 +1,5 @@
 import pytest
+import random
 import edge
 
 
@@ -41,3 +42,24 @@ def test_total_length(edges):
 
 def test_shortest_edge(edges):
     assert edge.shortest_edge(edges) == edges[0]
+
+
+def test_total_lengths(edges):
+    totals = edge.total_lengths([edges, [], edges[1:]])
+    assert totals.tolist() == [edge.total_length(edges), 0.0, edge.total_length(edges[1:])]
+    assert len(edge.total_lengths([])) == 0
+
+
+def test_total_lengths_rounding():
+    # the same sums as total_length, down to the last bit
+    rng = random.Random(0)
+    edge_lists = [[edge.Edge(0, 1, 0, rng.uniform(0.0, 1000.0)) for _ in range(rng.randrange(30))]
+                  for _ in range(200)]
+    assert edge.total_lengths(edge_lists).tolist() == [edge.total_length(e) for e in edge_lists]
+
+
+def test_shortest_edges(edges):
+    ties = [edges[2], edge.Edge(u=2, v=3, key=1, length=110.0)]
+    assert edge.shortest_edges([edges, edges[1:], ties]) == [edges[0], edges[2], edges[2]]
+    with pytest.raises(ValueError):
+        edge.shortest_edges([edges, []])
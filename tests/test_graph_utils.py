@@ -0,0 +1,33 @@
+import graph_utils
+from edge import Edge
+
+
+def test_get_edges_from_paths(grid):
+    paths = [[0, 2, 3, 4, 0], [0, 8], [6]]
+    assert graph_utils.get_edges_from_paths(grid, paths) == \
+        [graph_utils.get_edges_from_path(grid, path) for path in paths]
+
+
+def test_get_edges_from_paths_parallel(grid):
+    grid.add_edge(2, 0, 1, length=0.5)
+    grid.add_edge(2, 0, 3, length=0.25)
+    assert graph_utils.get_edges_from_paths(grid, [[0, 2, 0], [2, 3]]) == \
+        [[Edge(0, 2, 3, 0.25), Edge(2, 0, 3, 0.25)], [Edge(2, 3, 0, 1.0)]]
+
+
+def test_parallel_edges_between_u_and_v(grid):
+    # keys are not always contiguous, e.g. after simplification
+    grid.add_edge(2, 0, 2, length=0.5)
+    assert graph_utils.parallel_edges_between_u_and_v(grid, 0, 2) == [Edge(0, 2, 0, 1.0), Edge(0, 2, 2, 0.5)]
+    assert graph_utils.parallel_edges_between_u_and_v(grid, 0, 3) == []
+
+
+def test_get_edges_from_path_parallel(grid):
+    grid.add_edge(2, 0, 2, length=0.5)
+    expected = [Edge(3, 2, 0, 1.0), Edge(2, 0, 2, 0.5), Edge(0, 4, 0, 1.0)]
+    assert graph_utils.get_edges_from_path(grid, [3, 2, 0, 4]) == expected
+
+    index = graph_utils.shortest_edge_index(grid)
+    assert index[(0, 2)] == (2, 0.5)
+    assert graph_utils.get_edges_from_path(grid, [3, 2, 0, 4], index) == expected
+    assert graph_utils.get_edges_from_paths(grid, [[3, 2, 0, 4]], index) == [expected]
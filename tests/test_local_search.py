@@ -0,0 +1,107 @@
+import pytest
+from collections import Counter
+import networkx as nx
+import random
+from route import Route
+from route_finder import RouteFinder
+import graph_utils
+import local_search
+
+
+def make_route(G, nodes):
+    route = Route()
+    route.nodes.append(nodes[0])
+    for e in graph_utils.get_edges_from_path(G, nodes):
+        route.add_edge(e)
+    return route
+
+
+def check_route(G, route, source, max_distance):
+    assert route.nodes[0] == source
+    assert route.nodes[-1] == source
+    assert route.distance <= max_distance + 1e-9
+    assert route.distance == pytest.approx(sum(e.length for e in route.edges))
+    for u, v, e in zip(route.nodes[:-1], route.nodes[1:], route.edges):
+        assert (e.u, e.v) == (u, v)
+        assert G.edges[u, v, e.key]['length'] == e.length
+
+
+def test_insert_detours(grid):
+    rf = RouteFinder(grid, 0, 4.0)
+    route = local_search.improve_route(rf, make_route(grid, [0, 2, 0]))
+    check_route(grid, route, 0, 4.0)
+    assert rf.count_new_nodes(route) == 3
+    assert route.distance == pytest.approx(4.0)
+
+
+def test_remove_retraced_legs(grid):
+    # going out to node 2 and back visits no new node, and leaves no distance for the loop around 4
+    rf = RouteFinder(grid, 0, 6.0, visited=[2])
+    route = local_search.improve_route(rf, make_route(grid, [0, 2, 0, 4, 5, 6, 0]), max_rounds=1)
+    assert route.nodes[:4] != [0, 2, 0, 4]
+    check_route(grid, route, 0, 6.0)
+    assert rf.count_new_nodes(route) > rf.count_new_nodes(make_route(grid, [0, 2, 0, 4, 5, 6, 0]))
+
+
+def test_replace_segments(grid):
+    rf = RouteFinder(grid, 0, 6.0, visited=[2, 3, 4])
+    # the detour through 3 is longer than going from 2 to 4 through 0, and visits no new nodes
+    route = local_search.improve_route(rf, make_route(grid, [0, 2, 3, 4, 0]), max_rounds=1)
+    check_route(grid, route, 0, 6.0)
+    assert 3 not in route.nodes
+
+
+@pytest.fixture
+def streets():
+    random.seed(1)
+    G = nx.MultiGraph(nx.convert_node_labels_to_integers(nx.grid_2d_graph(8, 8)))
+    for u, v, k in G.edges(keys=True):
+        G.edges[u, v, k]['length'] = random.uniform(1.0, 2.0)
+    return G
+
+
+@pytest.mark.parametrize('source', [0, 9, 27, 36])
+def test_improve_greedy_route(streets, source):
+    visited = list(range(0, 64, 3))
+    route = RouteFinder(streets, source, 12.0, visited=visited).greedy_nearest()
+
+    rf = RouteFinder(streets, source, 12.0, visited=visited)
+    improved = local_search.improve_route(rf, route)
+    check_route(streets, improved, source, 12.0)
+    assert ((rf.count_new_nodes(improved), -improved.distance)
+            >= (rf.count_new_nodes(route), -route.distance))
+    assert route.nodes == RouteFinder(streets, source, 12.0, visited=visited).greedy_nearest().nodes
+
+
+@pytest.mark.parametrize('seed', range(0, 300, 3))
+def test_moves_keep_counts(seed):
+    # the number of times the route visits each node stays right after every move,
+    # and the result is never worse than the input route (nor just the source)
+    rng = random.Random(seed)
+    G = nx.MultiGraph(nx.convert_node_labels_to_integers(nx.grid_2d_graph(6, 6)))
+    for u, v, k in G.edges(keys=True):
+        G.edges[u, v, k]['length'] = rng.uniform(0.5, 1.5)
+    source, max_distance = rng.randrange(36), rng.uniform(3.0, 10.0)
+    visited = rng.sample(range(36), 12)
+    route = RouteFinder(G, source, max_distance, visited=visited).greedy_nearest()
+
+    rf = RouteFinder(G, source, max_distance, visited=visited)
+    search = local_search._LocalSearch(rf, route)
+    improved = True
+    while improved:
+        improved = False
+        moves = [search.remove_retraced_legs, lambda: search.replace_segments(8), search.insert_detours]
+        for move in moves:
+            improved |= move()
+            assert +search.counts == Counter(search.nodes)
+            assert search.lengths == search.csr.lengths[search.slots].tolist()
+            assert search.distance == pytest.approx(sum(search.lengths))
+            assert search.candidate_distances == sorted(
+                search.distance_from_source[i] for i in range(36)
+                if rf.visited[i] == 0 and search.counts[i] == 0
+                and search.distance_from_source[i] < float('inf'))
+
+    improved = search.to_route()
+    check_route(G, improved, source, max_distance)
+    assert len(improved.nodes) > 1
+    assert rf.count_new_nodes(improved) >= rf.count_new_nodes(route)
@@ -1,4 +1,7 @@
-from route import Route
+import pytest
+from route import CompactRoute, Route
+from edge import Edge
+from csr_graph import CSRGraph
 
 
 def test_route():
@@ -6,3 +9,74 @@ def test_route():
     assert r.nodes == []
     assert r.edges == []
     assert r.distance == 0
+
+
+def test_route_copy():
+    r = Route()
+    r.nodes.append(0)
+    r.add_edge(Edge(0, 2, 0, 1.0))
+
+    c = r.copy()
+    assert c.nodes == [0, 2]
+    assert c.edges == [Edge(0, 2, 0, 1.0)]
+    assert c.distance == 1.0
+
+    # changing the original does not change the copy
+    r.add_edge(Edge(2, 3, 0, 1.0))
+    assert c.nodes == [0, 2]
+    assert len(c.edges) == 1
+    assert c.distance == 1.0
+
+
+def test_compact_route():
+    r = CompactRoute()
+    assert len(r) == 0
+    assert r.distance == 0
+
+    r = CompactRoute(0)
+    r.add_edge(3, 2, 1.0)
+    r.add_edge(5, 3, 2.5)
+    assert list(r.nodes) == [0, 2, 3]
+    assert list(r.slots) == [3, 5]
+    assert len(r) == 2
+    assert r.distance == 3.5
+
+    c = r.copy()
+    r.pop_edge()
+    assert list(r.nodes) == [0, 2]
+    assert r.distance == 1.0
+    assert list(c.nodes) == [0, 2, 3]
+    assert c.distance == 3.5
+
+
+def test_compact_route_conversion(grid):
+    csr = CSRGraph.from_networkx(grid)
+    route = Route()
+    route.nodes.append(0)
+    for u, v in [(0, 2), (2, 3), (3, 4), (4, 0)]:
+        route.add_edge(Edge(u, v, 0, 1.0))
+
+    compact = CompactRoute.from_route(route, csr)
+    assert [csr.node_ids[i] for i in compact.nodes] == route.nodes
+    assert compact.distance == 4.0
+
+    back = compact.to_route(csr)
+    assert back.nodes == route.nodes
+    assert back.edges == route.edges
+    assert back.distance == route.distance
+
+
+def test_compact_route_missing_edge(grid):
+    csr = CSRGraph.from_networkx(grid)
+    route = Route()
+    route.nodes.append(0)
+    route.add_edge(Edge(0, 2, 0, 1.0))
+    route.add_edge(Edge(2, 6, 0, 1.0))  # nodes 2 and 6 are not adjacent
+
+    with pytest.raises(KeyError) as info:
+        CompactRoute.from_route(route, csr)
+    assert info.value.args[0] == (2, 6, 0)
+
+    # not turned into a RuntimeError inside a generator either
+    with pytest.raises(KeyError):
+        list(CompactRoute.from_route(r, csr) for r in [route])
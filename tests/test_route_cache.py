@@ -0,0 +1,75 @@
+from csr_graph import CSRGraph
+from route_cache import RouteCache
+from route_finder import RouteFinder
+
+
+def test_greedy_nearest(grid):
+    cache = RouteCache()
+    rf = RouteFinder(grid, 0, 6.0, visited=[2, 3])
+    route = cache.greedy_nearest(rf)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    # a repeated request is answered from the cache, and marks the route as visited just the same
+    rf = RouteFinder(grid, 0, 6.0, visited=[2, 3])
+    cached = cache.greedy_nearest(rf)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cached.nodes == route.nodes
+    assert cached.edges == route.edges
+    assert all(not rf.is_unvisited(n) for n in route.nodes)
+
+    # the same finder now has a different visited state, so it searches again
+    expected = RouteFinder(grid, 0, 6.0, visited=[2, 3] + route.nodes).greedy_nearest()
+    assert cache.greedy_nearest(rf).nodes == expected.nodes
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_keys(grid):
+    cache = RouteCache()
+    rf = RouteFinder(grid, 0, 4.0)
+    key = cache.key(rf, 'greedy_nearest')
+    assert cache.key(RouteFinder(grid, 0, 4.0), 'greedy_nearest') == key
+    assert cache.key(RouteFinder(CSRGraph.from_networkx(grid), 0, 4.0), 'greedy_nearest') == key
+    assert cache.key(rf, 'best_route') != key
+    assert cache.key(RouteFinder(grid, 2, 4.0), 'greedy_nearest') != key
+    assert cache.key(RouteFinder(grid, 0, 5.0), 'greedy_nearest') != key
+    assert cache.key(RouteFinder(grid, 0, 4.0, visited=[3]), 'greedy_nearest') != key
+
+    grid.edges[0, 2, 0]['length'] = 1.5
+    assert cache.key(RouteFinder(CSRGraph.from_networkx(grid), 0, 4.0), 'greedy_nearest') != key
+
+
+def test_brute_force_and_best_route(grid):
+    cache = RouteCache()
+    rf = RouteFinder(grid, 0, 4.0)
+    routes = cache.brute_force(rf)
+    assert len(routes) == 32
+    routes[0].nodes.append(5)  # changing a returned route does not change the cache
+    assert [r.nodes for r in cache.brute_force(rf)] == [r.nodes for r in rf.brute_force()]
+    assert len(cache.brute_force(rf, dedup=True)) == 22
+
+    route, score = cache.best_route(rf)
+    assert (route.nodes, score) == (rf.best_route()[0].nodes, 4)
+    assert cache.best_route(rf)[0].nodes == route.nodes
+    assert (cache.hits, cache.misses) == (2, 3)
+
+
+def test_eviction(grid):
+    cache = RouteCache(max_entries=2)
+    for max_distance in [2.0, 4.0, 6.0]:
+        cache.best_route(RouteFinder(grid, 0, max_distance))
+    assert len(cache) == 2
+    cache.best_route(RouteFinder(grid, 0, 6.0))
+    cache.best_route(RouteFinder(grid, 0, 2.0))
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_disk(grid, tmp_path):
+    path = str(tmp_path / 'cache')
+    route = RouteCache(path=path).greedy_nearest(RouteFinder(grid, 0, 6.0))
+
+    cache = RouteCache(path=path)
+    assert cache.greedy_nearest(RouteFinder(grid, 0, 6.0)).nodes == route.nodes
+    assert (cache.hits, cache.misses) == (1, 0)
+    cache.clear()
+    cache.greedy_nearest(RouteFinder(grid, 0, 6.0))
+    assert (cache.hits, cache.misses) == (2, 0)
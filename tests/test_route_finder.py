@@ -6,9 +6,11 @@ import os
 os.environ['USE_PYGEOS'] = '0'
 import osmnx as ox
 
+from csr_graph import CSRGraph
 from route_finder import RouteFinder
 from edge import Edge
 from route import Route
+from search_stats import SearchStats
 import networkx as nx
 
 
@@ -100,6 +102,20 @@ def test_get_incident_edges_grid(rf_grid):
     assert Edge(8, 7, 0, 1.0) in incident_edges
 
 
+def test_incident_cache(grid):
+    rf = RouteFinder(grid, 0, 4.0, cache_size=2)
+    assert len(rf.brute_force()) == 32
+    assert len(rf._incident_cache) == 2
+
+    rf = RouteFinder(grid, 0, 4.0, cache_size=None)
+    assert len(rf.brute_force()) == 32
+    assert len(rf._incident_cache) == 9
+
+    # the cached list can't be changed through the list that is returned
+    rf.get_incident_edges(0).clear()
+    assert len(rf.get_incident_edges(0)) == 4
+
+
 def test_get_viable_edges_grid(grid, rf_grid):
     route = Route()
     route.nodes = [0, 2, 3]
@@ -113,6 +129,80 @@ def test_get_viable_edges_grid(grid, rf_grid):
     assert Edge(3, 4, 0, 1.0) in viable_edges
 
 
+def test_get_distance_from_source_grid(rf_grid):
+    distance_from_source = rf_grid.get_distance_from_source()
+    index = rf_grid.csr.index
+    assert distance_from_source[index[0]] == pytest.approx(0.0)
+    for n in [2, 4, 6, 8]:
+        assert distance_from_source[index[n]] == pytest.approx(1.0)
+    for n in [1, 3, 5, 7]:
+        assert distance_from_source[index[n]] == pytest.approx(2.0)
+
+    # the table is computed once and reused
+    assert rf_grid.get_distance_from_source() is distance_from_source
+
+
+def test_shared_distance_from_source_grid(grid, rf_grid):
+    distance_from_source = rf_grid.get_distance_from_source()
+    rf = RouteFinder(grid, 0, 4.0, distance_from_source=distance_from_source)
+    assert rf.get_distance_from_source() is distance_from_source
+    assert len(rf.brute_force()) == 32
+
+
+def test_route_finder_shares_graph(grid, rf_grid):
+    # the finder does not copy or modify the input graph
+    assert rf_grid.G is grid
+    rf_grid.greedy_nearest()
+    assert 'visited' not in grid.nodes[0]
+
+    # finders over the same graph share one CSR graph, but not their visited state
+    rf = RouteFinder(grid, 0, 4.0)
+    assert rf.csr is rf_grid.csr
+    assert rf.is_unvisited(0)
+    assert not rf_grid.is_unvisited(0)
+
+
+def test_route_finder_from_csr_graph(rf_grid):
+    rf = RouteFinder(rf_grid.csr, 0, 4.0)
+    assert len(rf.brute_force()) == 32
+
+
+def test_mark_as_visited_grid(grid):
+    rf = RouteFinder(grid, 0, 4.0, visited=[2, 3])
+    assert not rf.is_unvisited(2)
+    assert not rf.is_unvisited(3)
+    assert rf.is_unvisited(4)
+
+    rf.mark_as_visited(4)
+    assert not rf.is_unvisited(4)
+
+
+def test_path_to_next_node_grid(grid):
+    rf = RouteFinder(grid, 0, 6.0, visited=[0, 2, 4, 6, 8])
+    route = Route()
+    route.nodes.append(0)
+    path = rf.path_to_next_node(route)
+    assert len(path) == 3
+    assert path[0] == 0
+    assert path[-1] in [1, 3, 5, 7]
+
+    # with too little distance left to reach an unvisited node, go to the nearest visited node
+    rf = RouteFinder(grid, 0, 3.0, visited=[0, 2, 4, 6, 8])
+    path = rf.path_to_next_node(route)
+    assert len(path) == 2
+    assert path[-1] in [2, 4, 6, 8]
+
+
+def test_greedy_nearest_grid(grid):
+    route = RouteFinder(grid, 0, 4.0).greedy_nearest()
+    assert route.nodes == [0, 2, 1, 8, 0]
+    assert route.distance == pytest.approx(4.0)
+
+    route = RouteFinder(grid, 0, 6.0, visited=[2, 3]).greedy_nearest()
+    assert route.nodes == [0, 4, 5, 6, 7, 8, 0]
+    assert route.distance == pytest.approx(6.0)
+
+
 def test_brute_force_finds_all(rf_grid):
     routes = rf_grid.brute_force()
     assert len(routes) == 32
@@ -124,6 +214,127 @@ def test_brute_force_distances(rf_grid):
         assert r.distance == pytest.approx(4.0)
 
 
+def test_iter_routes(rf_grid):
+    routes = rf_grid.brute_force()
+    assert [r.nodes for r in rf_grid.iter_routes()] == [r.nodes for r in routes]
+
+
+def test_iter_routes_compact(rf_grid):
+    routes = rf_grid.brute_force()
+    compact = list(rf_grid.iter_routes(compact=True))
+    assert [r.to_route(rf_grid.csr).nodes for r in compact] == [r.nodes for r in routes]
+    assert [r.to_route(rf_grid.csr).edges for r in compact] == [r.edges for r in routes]
+
+
+def test_iter_routes_limits(rf_grid):
+    routes = list(rf_grid.iter_routes(max_routes=5))
+    assert len(routes) == 5
+
+    # every route yielded is independent of the search that is still going on
+    assert len(set(str(r.nodes) for r in routes)) == 5
+    for r in routes:
+        assert r.nodes[-1] == 0
+
+    assert len(list(rf_grid.iter_routes(time_limit=60.0))) == 32
+    assert len(list(rf_grid.iter_routes(time_limit=0.0))) < 32
+
+
+@pytest.fixture
+def cycle():
+    # a long cycle of nodes, so that routes are longer than Python's recursion limit
+    G = nx.MultiGraph(nx.cycle_graph(3000))
+    nx.set_edge_attributes(G, name='length', values=1.0)
+    return G
+
+
+def test_long_routes(cycle):
+    route = RouteFinder(cycle, 0, 3000.0).greedy_nearest()
+    assert len(route.edges) == 3000
+    assert route.nodes[-1] == 0
+
+    route = next(RouteFinder(cycle, 0, 3000.0).iter_routes())
+    assert len(route.edges) == 3000
+
+
+def test_split(rf_grid):
+    assert [r.nodes for r in rf_grid.split(0)] == [[0]]
+    assert [r.nodes for r in rf_grid.split(1)] == [[0, 2], [0, 4], [0, 6], [0, 8]]
+    assert len(rf_grid.split(2)) == 12
+
+
+def test_brute_force_processes(rf_grid):
+    routes = rf_grid.brute_force()
+    for split_depth in [1, 2, 5]:
+        parallel_routes = rf_grid.brute_force(processes=2, split_depth=split_depth)
+        assert [r.nodes for r in parallel_routes] == [r.nodes for r in routes]
+
+
+def edge_multiset(route):
+    return sorted((min(e.u, e.v), max(e.u, e.v), e.key) for e in route.edges)
+
+
+def test_brute_force_dedup(rf_grid):
+    routes = rf_grid.brute_force()
+    unique = rf_grid.brute_force(dedup=True)
+    assert len(unique) == 22
+
+    # the first route with each set of edges is kept, and the rest are skipped
+    expected = []
+    for r in routes:
+        if all(edge_multiset(r) != edge_multiset(u) for u in expected):
+            expected.append(r)
+    assert [r.nodes for r in unique] == [r.nodes for r in expected]
+
+    assert [r.nodes for r in rf_grid.iter_routes(dedup=True)] == [r.nodes for r in unique]
+    for split_depth in [1, 2]:
+        parallel_routes = rf_grid.brute_force(processes=2, split_depth=split_depth, dedup=True)
+        assert [r.nodes for r in parallel_routes] == [r.nodes for r in unique]
+
+
+def test_best_route_processes(grid):
+    rf = RouteFinder(grid, 0, 6.0, visited=[2, 3])
+    route, score = rf.best_route()
+    for split_depth in [1, 3]:
+        parallel_route, parallel_score = rf.best_route(processes=2, split_depth=split_depth)
+        assert parallel_score == score
+        assert parallel_route.nodes == route.nodes
+
+
+def test_stats_brute_force(grid):
+    stats = SearchStats()
+    rf = RouteFinder(grid, 0, 4.0, stats=stats)
+    rf.brute_force()
+    assert stats.shortest_path_queries == 1
+    assert stats.nodes_settled == 9
+    assert stats.routes_emitted == 32
+    assert stats.edges_expanded > 32
+    assert stats.backtracks == stats.edges_expanded
+    assert 'brute_force' in stats.phase_times
+    assert 'distance_from_source' in stats.phase_times
+
+
+def test_stats_greedy_nearest(grid):
+    stats = SearchStats()
+    rf = RouteFinder(grid, 0, 6.0, visited=[2, 4, 6, 8], stats=stats)
+    route = rf.greedy_nearest()
+    assert stats.routes_emitted == 1
+    assert stats.edges_expanded == len(route.edges)
+    assert stats.shortest_path_queries > 1  # the neighbours of 0 are visited, so it had to look further
+    assert 'path_to_next_node' in stats.phase_times
+
+
+def test_tracer(grid):
+    calls = []
+    rf = RouteFinder(grid, 0, 4.0, tracer=lambda name, stats: calls.append((name, stats.routes_emitted)))
+    rf.best_route()
+    rf.greedy_nearest()
+    assert [name for name, _ in calls] == ['best_route', 'greedy_nearest']
+    assert rf.stats is not None
+
+    # no statistics are kept unless asked for
+    assert RouteFinder(grid, 0, 4.0).stats is None
+
+
 def test_brute_force_route_nodes(rf_grid):
     routes = rf_grid.brute_force()
 
@@ -176,8 +387,224 @@ def test_brute_force_route_nodes(rf_grid):
     assert str([0, 2, 1, 8, 0]) in nodes
 
 
-#def test_maximize_new_nodes(rf_grid):
-#    routes = rf_grid.brute_force()
-#    routes = RouteFinder.maximize_new_nodes(routes)
-#    assert len(routes) == 8
+def test_maximize_new_nodes(rf_grid):
+    routes = rf_grid.brute_force()
+    routes = rf_grid.maximize_new_nodes(routes)
+    assert len(routes) == 8
+
+
+def test_count_new_nodes(grid):
+    rf = RouteFinder(grid, 0, 4.0, visited=[0, 3])
+    route = Route()
+    route.nodes = [0, 2, 3, 4, 0]
+    assert rf.count_new_nodes(route) == 2
+
+
+def test_best_route_grid(rf_grid):
+    routes = rf_grid.maximize_new_nodes(rf_grid.brute_force())
+
+    route, score = rf_grid.best_route()
+    assert score == 4
+    assert route.nodes == routes[0].nodes
+    assert route.distance == pytest.approx(4.0)
+
+
+def test_best_route_visited_grid(grid):
+    rf = RouteFinder(grid, 0, 6.0, visited=[0, 2, 3, 4])
+    best = rf.maximize_new_nodes(rf.brute_force())
+
+    route, score = rf.best_route()
+    assert score == rf.count_new_nodes(best[0])
+    assert route.nodes == best[0].nodes
+
+
+def test_anytime_route_complete(grid):
+    rf = RouteFinder(grid, 0, 6.0, visited=[2, 3])
+    _, best_score = rf.best_route()
+
+    result = rf.anytime_route()
+    assert result.complete
+    assert result.new_nodes == best_score
+    assert result.route.nodes == rf.best_route()[0].nodes
+    assert result.new_nodes == rf.count_new_nodes(result.route)
+    assert result.route.nodes[-1] == 0
+    assert result.route.distance <= 6.0
+
+    # no nodes are marked as visited
+    assert [n for n in grid.nodes if not rf.is_unvisited(n)] == [2, 3]
+
 
+def test_anytime_route_limits(grid):
+    rf = RouteFinder(grid, 0, 6.0)
+
+    result = rf.anytime_route(max_expansions=0)
+    assert not result.complete
+    assert result.route.nodes == [0]
+
+    # the greedy route is cut short and closed by the shortest path back to the source
+    result = rf.anytime_route(max_expansions=2)
+    assert not result.complete
+    assert result.route.nodes[:3] == [0, 2, 1]
+    assert result.route.nodes[-1] == 0
+    assert result.route.distance == pytest.approx(4.0)
+    assert result.new_nodes == rf.count_new_nodes(result.route) == 3
+
+    result = rf.anytime_route(time_limit=0.0)
+    assert not result.complete
+    assert result.route.nodes[-1] == 0
+
+    assert rf.anytime_route(time_limit=60.0).complete
+
+
+def test_prune(grid):
+    rf = RouteFinder(grid, 0, 2.0, visited=[2, 3], prune=True)
+    assert sorted(rf.csr.node_ids.tolist()) == [0, 2, 4, 6, 8]
+    assert not rf.is_unvisited(2)
+
+    expected = RouteFinder(grid, 0, 2.0, visited=[2, 3])
+    assert [r.nodes for r in rf.brute_force()] == [r.nodes for r in expected.brute_force()]
+    assert rf.best_route()[0].nodes == expected.best_route()[0].nodes
+    assert rf.greedy_nearest().nodes == expected.greedy_nearest().nodes
+
+    # with a distance table for the whole graph
+    table = RouteFinder(grid, 0, 2.0).get_distance_from_source()
+    rf = RouteFinder(grid, 0, 2.0, distance_from_source=table, prune=True)
+    assert sorted(rf.csr.node_ids.tolist()) == [0, 2, 4, 6, 8]
+    assert rf.get_distance_from_source().tolist() == [1.0 if n else 0.0 for n in rf.csr.node_ids.tolist()]
+
+
+def test_pruned_distance_from_source(grid):
+    rf = RouteFinder(grid, 0, 2.0, prune=True)
+    table = rf.get_distance_from_source()
+    expected = len(RouteFinder(grid, 0, 2.0).brute_force())
+    assert len(RouteFinder(rf.csr, 0, 2.0, distance_from_source=table).brute_force()) == expected
+    for prune in [False, True]:
+        with pytest.raises(ValueError):
+            RouteFinder(grid, 0, 2.0, distance_from_source=table, prune=prune)
+
+
+def test_with_max_distance(grid):
+    rf = RouteFinder(grid, 0, 6.0, visited=[2, 3])
+    small = rf.with_max_distance(4.0)
+    assert small.max_distance == 4.0
+    assert small.get_distance_from_source() is rf.get_distance_from_source()
+    assert not small.is_unvisited(2) and small.is_unvisited(4)
+
+    small.greedy_nearest()
+    assert rf.is_unvisited(4)
+    assert small.get_incident_edges(0) == rf.get_incident_edges(0)
+    with pytest.raises(ValueError):
+        rf.with_max_distance(8.0)
+
+
+def test_with_max_distance_pruned(grid):
+    rf = RouteFinder(grid, 0, 2.0, prune=True)
+    small = rf.with_max_distance(2.0)
+    assert small.csr is rf.csr
+    # nodes and edges outside of the subgraph are ignored, as by the pruned finder
+    small.mark_nodes_as_visited([2, 3])
+    small.remove_edges([(3, 4, 0)])
+    assert not small.is_unvisited(2)
+    assert len(small.brute_force()) == len(RouteFinder(grid, 0, 2.0, visited=[2]).brute_force())
+
+
+def test_sweep(grid):
+    budgets = [6.0, 2.0, 4.0]
+    rf = RouteFinder(grid, 0, max(budgets), visited=[2, 3])
+    results = rf.sweep(budgets, best=True)
+    assert [r.max_distance for r in results] == budgets
+
+    for r, max_distance in zip(results, budgets):
+        expected = RouteFinder(grid, 0, max_distance, visited=[2, 3])
+        assert r.best_new_nodes == expected.best_route()[1]
+        # the same route as a search for this maximum distance alone, even among routes that tie
+        assert r.best_route.nodes == expected.best_route()[0].nodes
+        assert r.new_nodes == expected.count_new_nodes(r.route)
+        assert r.route.nodes == expected.greedy_nearest().nodes
+        assert r.best_new_nodes == rf.count_new_nodes(r.best_route)
+        assert r.best_route.distance <= max_distance
+
+    # no nodes are marked as visited
+    assert rf.is_unvisited(4)
+    assert rf.sweep(budgets)[0].best_route is None
+
+    # the best route for 6.0 has as many new nodes as the best route for 8.0, which comes first
+    rf = RouteFinder(grid, 0, 8.0, visited=[2, 3])
+    result = rf.sweep([6.0, 8.0], best=True)[1]
+    assert result.best_route.nodes == RouteFinder(grid, 0, 8.0, visited=[2, 3]).best_route()[0].nodes
+
+
+def test_mark_nodes_as_visited(grid):
+    rf = RouteFinder(grid, 0, 4.0)
+    rf.mark_nodes_as_visited([2, 3, 4])
+    assert [rf.is_unvisited(n) for n in [2, 3, 4, 5]] == [False, False, False, True]
+    rf.mark_nodes_as_unvisited(n for n in [3, 4])
+    assert [rf.is_unvisited(n) for n in [2, 3, 4, 5]] == [False, True, True, True]
+    with pytest.raises(KeyError):
+        rf.mark_nodes_as_visited([10])
+
+    # a pruned finder ignores nodes outside its subgraph
+    rf = RouteFinder(grid, 0, 2.0, prune=True)
+    rf.mark_nodes_as_visited([2, 3])
+    assert not rf.is_unvisited(2)
+
+
+def test_update_edges(grid):
+    rf = RouteFinder(grid, 0, 6.0, visited=[2], cache_size=None)
+    shared = rf.with_max_distance(4.0)
+    for n in grid.nodes:
+        rf.get_incident_edges(n)
+    csr = rf.csr
+
+    # the same as a finder for the changed graph
+    rf.set_edge_lengths({(0, 4, 0): 2.0, (5, 6, 0): 0.5})
+    rf.remove_edges([(0, 2, 0)])
+    grid.edges[0, 4, 0]['length'] = 2.0
+    grid.edges[5, 6, 0]['length'] = 0.5
+    grid.remove_edge(0, 2, 0)
+    expected = RouteFinder(CSRGraph.from_networkx(grid), 0, 6.0, visited=[2])
+    assert rf.get_distance_from_source().tolist() == expected.get_distance_from_source().tolist()
+    for n in grid.nodes:
+        assert rf.get_incident_edges(n) == expected.get_incident_edges(n)
+    (route, new_nodes), (expected_route, expected_new_nodes) = rf.best_route(), expected.best_route()
+    assert route.nodes == expected_route.nodes and new_nodes == expected_new_nodes
+
+    # finders that shared the graph and the distance table are not affected
+    assert shared.csr is csr and rf.csr is not csr
+    assert shared.get_distance_from_source()[csr.index[2]] == 1.0
+    assert len(shared.brute_force()) == 32
+
+    with pytest.raises(KeyError):
+        rf.remove_edges([(0, 2, 0)])
+
+
+def test_update_edges_in_place(grid):
+    rf = RouteFinder(grid, 0, 6.0, cache_size=None)
+    table = rf.get_distance_from_source()
+    rf.set_edge_lengths({(0, 4, 0): 2.0})
+    csr, distance = rf.csr, rf.get_distance_from_source()
+    assert csr._index is RouteFinder(grid, 0, 6.0).csr._index  # (the nodes are the same)
+    assert table[csr.index[4]] == 1.0 and distance[csr.index[4]] == 2.0
+    for n in grid.nodes:
+        rf.get_incident_edges(n)
+
+    # later changes of lengths are made to the finder's own copies
+    fingerprint = csr.fingerprint()
+    rf.set_edge_lengths({(0, 4, 0): 3.0, (5, 6, 0): 0.5})
+    assert rf.csr is csr and rf.get_distance_from_source() is distance
+    assert csr.fingerprint() != fingerprint
+    grid.edges[0, 4, 0]['length'] = 3.0
+    grid.edges[5, 6, 0]['length'] = 0.5
+    expected = RouteFinder(CSRGraph.from_networkx(grid), 0, 6.0)
+    assert distance.tolist() == expected.get_distance_from_source().tolist()
+    for n in grid.nodes:
+        assert rf.get_incident_edges(n) == expected.get_incident_edges(n)
+
+    # once they are shared with another finder, the next change copies them again
+    small = rf.with_max_distance(4.0)
+    small.set_edge_lengths({(0, 4, 0): 1.0})
+    assert small.csr is not csr and small.get_distance_from_source() is not distance
+    assert csr.edge_length(csr.index[0], csr.index[4]) == 3.0
+    assert distance.tolist() == expected.get_distance_from_source().tolist()
+    rf.set_edge_lengths({(0, 4, 0): 1.0})
+    assert rf.csr is not csr
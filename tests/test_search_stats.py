@@ -0,0 +1,26 @@
+import pytest
+from search_stats import SearchStats
+
+
+def test_search_stats():
+    stats = SearchStats()
+    assert stats.as_dict() == {'shortest_path_queries': 0,
+                               'nodes_settled': 0,
+                               'edges_expanded': 0,
+                               'routes_emitted': 0,
+                               'backtracks': 0}
+
+
+def test_phase():
+    stats = SearchStats()
+    with stats.phase('search'):
+        pass
+    with stats.phase('search'):
+        pass
+    assert stats.phase_times['search'] >= 0
+    assert stats.as_dict()['time_search'] == pytest.approx(stats.phase_times['search'])
+
+    with pytest.raises(ValueError):
+        with stats.phase('error'):
+            raise ValueError()
+    assert 'error' in stats.phase_times
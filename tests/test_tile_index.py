@@ -0,0 +1,48 @@
+import pytest
+import numpy as np
+from csr_graph import CSRGraph
+from route_finder import RouteFinder
+from tile_index import TileIndex
+
+
+@pytest.mark.parametrize('crs, scale', [('epsg:32633', 100.0), ('epsg:4326', 0.0008)])
+def test_extract(street_grid, tmp_path, crs, scale):
+    G = street_grid(20, crs, scale)
+    tiles = TileIndex.build(G, tile_size=3 * scale)
+    assert sorted(tiles.csr.node_ids.tolist()) == sorted(G.nodes)
+
+    tiles.save(str(tmp_path / 'tiles'))
+    tiles = TileIndex.load(str(tmp_path / 'tiles'))
+
+    csr = CSRGraph.from_networkx(G)
+    for source, radius in [(0, 300.0), (210, 500.0), (399, 150.0)]:
+        sub = tiles.extract(source, radius)
+        # every node within the radius is there, but not the whole graph
+        ball, _ = csr.ball(csr.index[source], radius)
+        assert set(ball.node_ids.tolist()) <= set(sub.node_ids.tolist())
+        assert sub.number_of_nodes() < csr.number_of_nodes()
+
+
+def test_build_without_coordinates(grid):
+    with pytest.raises(ValueError):
+        TileIndex.build(grid, 1.0)
+
+
+def test_node_index(street_grid):
+    tiles = TileIndex.build(street_grid(5, 'epsg:32633', 100.0), 200.0)
+    for n in range(25):
+        assert tiles.csr.node_ids[tiles.node_index(n)] == n
+    with pytest.raises(KeyError):
+        tiles.node_index(25)
+
+
+def test_route_finder_with_tiles(street_grid):
+    G = street_grid(20, 'epsg:32633', 100.0)
+    tiles = TileIndex.build(G, tile_size=300.0)
+    visited = list(range(0, 400, 7))
+
+    rf = RouteFinder(tiles, 210, 1000.0, visited=visited)
+    expected = RouteFinder(G, 210, 1000.0, visited=visited)
+    assert rf.csr.number_of_nodes() < expected.csr.number_of_nodes()
+    assert rf.greedy_nearest().nodes == expected.greedy_nearest().nodes
+    assert np.count_nonzero(rf.visited) <= np.count_nonzero(expected.visited)
@@ -0,0 +1,61 @@
+import numpy as np
+from csr_graph import CSRGraph
+from route import Route
+from route_finder import RouteFinder
+from visited_store import VisitedStore
+
+
+def test_visited_store():
+    store = VisitedStore([5, 3, 5, 1])
+    assert len(store) == 3
+    assert 3 in store
+    assert 4 not in store
+    assert store.node_ids.tolist() == [1, 3, 5]
+
+    store.add([4, 3])
+    assert store.node_ids.tolist() == [1, 3, 4, 5]
+
+
+def test_commit():
+    store = VisitedStore()
+    assert len(store) == 0
+
+    route = Route()
+    route.nodes = [0, 2, 3, 2, 0]
+    store.commit(route)
+    assert store.node_ids.tolist() == [0, 2, 3]
+
+
+def test_save_load(tmp_path):
+    path = str(tmp_path / 'visited.npy')
+    VisitedStore([10, 7, 8]).save(path)
+
+    store = VisitedStore.load(path)
+    assert isinstance(store.node_ids, np.memmap)
+    assert store.node_ids.tolist() == [7, 8, 10]
+
+    # the loaded store can still be updated and saved over its own file
+    store.add([9])
+    store.save(path)
+    assert VisitedStore.load(path, mmap=False).node_ids.tolist() == [7, 8, 9, 10]
+
+
+def test_mask(grid):
+    csr = CSRGraph.from_networkx(grid)
+    mask = VisitedStore([2, 3, 100]).mask(csr)
+    assert [int(n) for n in csr.node_ids[mask]] == [2, 3]
+    assert not VisitedStore().mask(csr).any()
+
+
+def test_route_finder_visited_store(grid):
+    store = VisitedStore([2, 3])
+    rf = RouteFinder(grid, 0, 6.0, visited=store)
+    assert not rf.is_unvisited(2)
+    assert not rf.is_unvisited(3)
+    assert rf.is_unvisited(4)
+
+    route = rf.greedy_nearest()
+    assert route.nodes == RouteFinder(grid, 0, 6.0, visited=[2, 3]).greedy_nearest().nodes
+
+    store.commit(route)
+    assert all(n in store for n in route.nodes)